@@ -1,12 +1,189 @@
+"""
+Admin for tables that grow to millions of rows.
+
+Changelists only ever join what they display (``list_select_related``),
+foreign keys to big tables use raw-id or autocomplete widgets instead of a
+``<select>`` of every row, filters and searches are limited to indexed
+columns, and the unfiltered row count is the database's estimate (see
+``EstimatedCountPaginator``) rather than a ``COUNT(*)`` over the table.
+"""
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from . import inventory, search
 from .models import Category, Product, Order, SubCategory, Address, Payment, CustomUser, OrderItem
 
-# Register your models here.
-admin.site.register(Category)
-admin.site.register(SubCategory)
-admin.site.register(CustomUser)
-admin.site.register(OrderItem)
-admin.site.register(Product)
-admin.site.register(Payment)
-admin.site.register(Address)
-admin.site.register(Order)
+# below this many rows the exact count is cheap enough
+ESTIMATE_THRESHOLD = 100_000
+ORDER_STATUSES = (inventory.PENDING, 'Delivered', inventory.CANCELLED, inventory.EXPIRED)
+
+
+def estimated_count(queryset):
+    """The planner's row estimate of ``queryset``'s table, or None where there is none."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Uses the table estimate for unfiltered changelists of big tables."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class OrderStatusFilter(admin.SimpleListFilter):
+    """Fixed choices: the default filter would SELECT DISTINCT over every order."""
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return [(status, status) for status in ORDER_STATUSES]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(status=self.value())
+        return queryset
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(LargeTableAdmin, UserAdmin):
+    list_display = ('username', 'email', 'raqam', 'is_staff', 'date_joined')
+    # the default is_staff/is_active/groups filters scan the whole table
+    list_filter = ()
+    # prefix and exact matches can use the unique indexes
+    search_fields = ('^username', '=email', '^raqam')
+    ordering = ('-id',)
+    fieldsets = UserAdmin.fieldsets + (('Store', {'fields': ('raqam', 'token_generation')}),)
+    readonly_fields = ('token_generation', 'last_login', 'date_joined')
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'updated_at')
+    search_fields = ('name',)
+
+
+@admin.register(SubCategory)
+class SubCategoryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'updated_at')
+    list_select_related = ('category',)
+    list_filter = ('category',)
+    search_fields = ('name',)
+    autocomplete_fields = ('category',)
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'sku', 'subcategory', 'cost', 'discount', 'stock', 'created_at')
+    list_select_related = ('subcategory',)
+    list_filter = ('category',)  # product_category_created_idx
+    search_fields = ('name',)  # replaced by the search index, see get_search_results
+    search_help_text = 'Words of the name, description or category, or an exact SKU.'
+    ordering = ('-created_at', '-id')
+    autocomplete_fields = ('subcategory',)
+    raw_id_fields = ('created_by',)
+    readonly_fields = ('created_at', 'updated_at')
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        by_sku = queryset.filter(sku=search_term)
+        if by_sku.exists():
+            return by_sku, False
+        return search.search_products(queryset, search_term), False
+
+
+class OrderItemInline(admin.TabularInline):
+    """Read-only: lines are priced and reserved at checkout."""
+    model = OrderItem
+    fields = readonly_fields = ('product', 'quantity', 'unit_price', 'discount')
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'status', 'order_date', 'item_count', 'total')
+    list_select_related = ('user',)
+    list_filter = (OrderStatusFilter,)  # order_status_date_idx
+    search_fields = ('=user__username',)
+    search_help_text = 'Order number or exact username.'
+    ordering = ('-order_date', '-id')
+    raw_id_fields = ('user', 'delivery_address')
+    readonly_fields = (
+        'order_date', 'item_count', 'subtotal', 'discount_total', 'total', 'stock_reserved', 'reserved_until',
+    )
+    inlines = (OrderItemInline,)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term.isdigit():
+            return queryset.filter(pk=search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'unit_price', 'discount')
+    list_select_related = ('order__user', 'product')
+    ordering = ('-id',)
+    raw_id_fields = ('order', 'product')
+
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'order', 'amount', 'payment_method', 'status', 'payment_date')
+    list_select_related = ('user', 'order__user')
+    search_fields = ('=user__username',)
+    search_help_text = 'Order number or exact username.'
+    ordering = ('-id',)
+    raw_id_fields = ('user', 'order')
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term.isdigit():
+            return queryset.filter(order_id=search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(Address)
+class AddressAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'street', 'district', 'city', 'is_default')
+    list_select_related = ('user',)
+    search_fields = ('=user__username',)
+    ordering = ('-id',)
+    raw_id_fields = ('user',)
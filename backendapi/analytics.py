@@ -0,0 +1,225 @@
+"""
+Daily sales rollups and the reports served from them.
+
+Every order that is not cancelled or expired is counted once in four rollup
+tables: per day (``DailySales``) and per day and category, subcategory and
+product. Reports only read those tables, so dashboards never aggregate
+``OrderItem`` rows or touch the checkout tables.
+
+The rollups are maintained incrementally. ``sync(order_id)`` runs after
+every commit that creates an order or changes its status, and adds or
+subtracts the order's lines when the order enters or leaves the counted
+statuses. It is registered as a robust ``on_commit`` callback: a failed sync
+is logged and never turns the already committed request into an error (run
+``rebuild_sales_rollups`` for the day to repair it). ``Order.sales_recorded`` says whether the order is currently
+counted; like ``stock_reserved`` in ``inventory``, only the caller that
+flips it applies the change, so repeated or concurrent syncs cannot count an
+order twice. Each table gets one multi-row ``INSERT ... ON CONFLICT`` /
+``ON DUPLICATE KEY UPDATE`` that adds to the existing totals.
+
+Lines are booked on the day the order was placed (``TIME_ZONE``), under the
+product's category at the time of booking. ``manage.py rebuild_sales_rollups``
+recomputes a date range from the order history, one day per transaction; run
+it after the first deploy, and preferably not on the current day while
+checkouts are running.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import (
+    CategoryDailySales, DailySales, Order, OrderItem, ProductDailySales, SubCategoryDailySales,
+)
+
+UNCOUNTED = ('Cancelled', 'Expired')
+MEASURES = ('orders', 'quantity', 'gross', 'discount', 'revenue')
+# level -> (rollup model, key field)
+LEVELS = {
+    'total': (DailySales, None),
+    'category': (CategoryDailySales, 'category'),
+    'subcategory': (SubCategoryDailySales, 'subcategory'),
+    'product': (ProductDailySales, 'product'),
+}
+ORDERINGS = ('revenue', 'quantity', 'orders')
+DEFAULT_DAYS = 30
+ROWS_PER_STATEMENT = 100
+
+
+def _items(**filters):
+    return OrderItem.objects.filter(**filters).select_related('order', 'product').only(
+        'quantity', 'unit_price', 'discount', 'order__order_date', 'product__subcategory', 'product__category',
+    )
+
+
+def _totals(items, sign=1):
+    """``{level: {(day, key id): [orders, quantity, gross, discount, revenue]}}`` of ``items``."""
+    totals = {level: {} for level in LEVELS}
+    counted = set()
+    for item in items:
+        day = timezone.localdate(item.order.order_date)
+        gross, discount = item.subtotal, item.discount_amount
+        keys = {
+            'total': (day,),
+            'category': (day, item.product.category_id),
+            'subcategory': (day, item.product.subcategory_id),
+            'product': (day, item.product_id),
+        }
+        for level, key in keys.items():
+            row = totals[level].setdefault(key, [0, 0, Decimal('0.00'), Decimal('0.00'), Decimal('0.00')])
+            if (level, key, item.order_id) not in counted:
+                counted.add((level, key, item.order_id))
+                row[0] += sign
+            row[1] += sign * item.quantity
+            row[2] += sign * gross
+            row[3] += sign * discount
+            row[4] += sign * (gross - discount)
+    return totals
+
+
+def _add(model, key_field, rows):
+    """Add ``rows`` (``{(day, key id): measures}``) to the totals stored in ``model``."""
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    keys = ['day'] + ([model._meta.get_field(key_field).column] if key_field else [])
+    columns = ', '.join(qn(column) for column in (*keys, *MEASURES))
+    if connection.vendor == 'mysql':
+        conflict = 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+            f'{qn(column)} = {qn(column)} + VALUES({qn(column)})' for column in MEASURES
+        )
+    else:
+        conflict = f"ON CONFLICT ({', '.join(qn(column) for column in keys)}) DO UPDATE SET " + ', '.join(
+            f'{qn(column)} = {table}.{qn(column)} + excluded.{qn(column)}' for column in MEASURES
+        )
+    placeholder = '(' + ', '.join(['%s'] * (len(keys) + len(MEASURES))) + ')'
+    ops = connection.ops
+    # in key order, so concurrent syncs take the rollup row locks in the same order
+    rows = sorted(rows.items())
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), ROWS_PER_STATEMENT):
+            chunk = rows[offset:offset + ROWS_PER_STATEMENT]
+            params = []
+            for (day, *key), (orders, quantity, *amounts) in chunk:
+                params += [ops.adapt_datefield_value(day), *key, orders, quantity]
+                params += [ops.adapt_decimalfield_value(amount, 14, 2) for amount in amounts]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([placeholder] * len(chunk))} {conflict}", params,
+            )
+
+
+def _apply(items, sign=1):
+    for level, rows in _totals(items, sign).items():
+        _add(*LEVELS[level], rows)
+
+
+def sync(order_id):
+    """Count or uncount ``order_id`` in the rollups if its status says so."""
+    with transaction.atomic():
+        orders = Order.objects.filter(pk=order_id)
+        if orders.filter(sales_recorded=False).exclude(status__in=UNCOUNTED).update(sales_recorded=True):
+            _apply(_items(order_id=order_id), 1)
+        elif orders.filter(sales_recorded=True, status__in=UNCOUNTED).update(sales_recorded=False):
+            _apply(_items(order_id=order_id), -1)
+
+
+def forget(order):
+    """Subtract an order that is about to be deleted."""
+    if Order.objects.filter(pk=order.pk, sales_recorded=True).update(sales_recorded=False):
+        _apply(_items(order_id=order.pk), -1)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def rebuild(start=None, end=None, batch_size=1000, progress=None):
+    """
+    Recompute the rollups of the days ``start`` to ``end`` (inclusive,
+    defaulting to the whole order history); returns the number of days.
+    ``progress`` is called with each finished day.
+    """
+    if start is None or end is None:
+        bounds = Order.objects.aggregate(first=Min('order_date'), last=Max('order_date'))
+        if bounds['first'] is None:
+            return 0
+        start = start or timezone.localdate(bounds['first'])
+        end = end or timezone.localdate(bounds['last'])
+    days = 0
+    day = start
+    while day <= end:
+        with transaction.atomic():
+            for model, _ in LEVELS.values():
+                model.objects.filter(day=day).delete()
+            lower, upper = _day_bounds(day)
+            placed = Order.objects.filter(order_date__gte=lower, order_date__lt=upper)
+            placed.filter(status__in=UNCOUNTED).update(sales_recorded=False)
+            placed.exclude(status__in=UNCOUNTED).update(sales_recorded=True)
+            ids = list(placed.filter(sales_recorded=True).values_list('pk', flat=True))
+            for offset in range(0, len(ids), batch_size):
+                _apply(_items(order_id__in=ids[offset:offset + batch_size]))
+        days += 1
+        if progress:
+            progress(day)
+        day += timedelta(days=1)
+    return days
+
+
+def parse_range(start=None, end=None):
+    """
+    ``(start, end)`` dates of a report from ``YYYY-MM-DD`` strings; the last
+    ``DEFAULT_DAYS`` days up to today by default. Raises ValueError.
+    """
+    dates = []
+    for value in (start, end):
+        day = parse_date(value) if value else None
+        if value and day is None:
+            raise ValueError(f'not a date: {value!r}')
+        dates.append(day)
+    start, end = dates
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise ValueError('start is after end')
+    return start, end
+
+
+def _rollups(level, start, end, ids=None):
+    model, key_field = LEVELS[level]
+    rollups = model.objects.filter(day__range=(start, end))
+    if ids and key_field:
+        rollups = rollups.filter(**{f'{key_field}__in': ids})
+    return rollups, key_field
+
+
+def _row(values, key_field=None, prefix=''):
+    row = {}
+    if 'day' in values:
+        row['day'] = values['day'].isoformat()
+    if key_field:
+        row['id'] = values[f'{key_field}_id']
+        row['name'] = values[f'{key_field}__name']
+    row.update(orders=values[prefix + 'orders'], quantity=values[prefix + 'quantity'])
+    row.update((name, str(values[prefix + name])) for name in ('gross', 'discount', 'revenue'))
+    return row
+
+
+def series(level, start, end, ids=None):
+    """One row per day (and per key of ``level``) between ``start`` and ``end``."""
+    rollups, key_field = _rollups(level, start, end, ids)
+    fields = ['day'] + ([f'{key_field}_id', f'{key_field}__name'] if key_field else [])
+    return [_row(values, key_field) for values in rollups.order_by(*fields[:2]).values(*fields, *MEASURES)]
+
+
+def top(level, start, end, ordering='revenue', limit=10):
+    """The ``limit`` keys of ``level`` with the highest ``ordering`` total between ``start`` and ``end``."""
+    rollups, key_field = _rollups(level, start, end)
+    totals = rollups.values(f'{key_field}_id', f'{key_field}__name').annotate(
+        **{f'total_{name}': Sum(name) for name in MEASURES},
+    ).order_by(f'-total_{ordering}', f'{key_field}_id')[:limit]
+    return [_row(values, key_field, prefix='total_') for values in totals]
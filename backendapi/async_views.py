@@ -0,0 +1,92 @@
+"""
+Async read path for the catalog endpoints under ASGI.
+
+``AsyncReadMixin.as_async_view(actions)`` turns a viewset into an async view:
+GET and HEAD run the viewset's ``a<action>`` coroutine (``alist``,
+``aretrieve``, ``atree``), which reads through Django's async ORM and async
+cache API, so a slow query or cache round trip suspends the request instead
+of blocking the worker. Filtering, pagination, serializers, ETags and the
+response cache are the ones the sync views use; only the I/O is awaited.
+Every other method is handed to the regular sync view.
+
+The async path does not authenticate: catalog reads are public and render
+the same for every user, and the JWT fallback could query the user table
+from the event loop. Responses are therefore always cached as anonymous.
+
+``ASYNC_CATALOG_READS`` routes the catalog URLs to these views; enable it
+for ASGI workers only, e.g. a separate pool behind the proxy for
+``/api/products/`` and ``/api/categories/``::
+
+    ASYNC_CATALOG_READS=1 gunicorn storebackend.asgi:application \\
+        -k uvicorn.workers.UvicornWorker --workers 3
+
+Under WSGI an async view costs an event loop per request, and under ASGI
+every sync view runs in a thread of its own, so the rest of the API is best
+left on the sync workers. ``manage.py bench_catalog`` compares both setups.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+SAFE_METHODS = ('get', 'head')
+
+
+class AsyncReadMixin:
+    """Async ``list``/``retrieve`` for DRF viewsets; see the module docstring."""
+
+    @classmethod
+    def as_async_view(cls, actions, **initkwargs):
+        sync_view = sync_to_async(cls.as_view(actions, **initkwargs))
+        action = actions.get('get')
+
+        async def view(request, *args, **kwargs):
+            if request.method.lower() not in SAFE_METHODS or action is None:
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = actions
+            self.action = action
+            return await self.adispatch(request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.actions = actions
+        view.csrf_exempt = True
+        return view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """``dispatch`` for a read: the same hooks, with the handler awaited."""
+        self.args = args
+        self.kwargs = kwargs
+        self.authentication_classes = ()
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            self.initial(request, *args, **kwargs)
+            response = await getattr(self, f'a{self.action}')(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
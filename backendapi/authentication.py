@@ -0,0 +1,100 @@
+"""
+Stateless JWT authentication.
+
+simplejwt's ``JWTAuthentication`` loads the user row on every request. Here
+tokens carry an ``auth_version`` claim (an HMAC of the password hash,
+``is_active`` and ``token_generation``) and the request user is rebuilt from
+the token's ``user_id`` plus a small ``{username, is_active, version}`` entry
+kept in the default cache for ``AUTH_USER_CACHE_TTL`` seconds. No query is made unless a
+view touches another user field, in which case the rest of the row is loaded
+in one go (see ``CustomUser.refresh_from_db``).
+
+Changing the password, deactivating the user or logging out of all devices
+(which bumps ``token_generation``) changes the version, so tokens issued
+before are rejected once the cache entry is dropped: saving a
+user drops it immediately through a signal, and with a per-process cache the
+TTL bounds how long another worker may still accept the old token.
+
+Tokens without the claim (minted before it existed, or by simplejwt's stock
+views) are rejected: they could not be revoked by any of the above.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils.crypto import salted_hmac
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+VERSION_CLAIM = 'auth_version'
+CACHE_KEY = 'backendapi:auth_user:{}'
+
+
+def auth_version(password, is_active, generation=0):
+    value = f'{password}:{is_active}:{generation}'
+    return salted_hmac('backendapi.authentication.auth_version', value).hexdigest()[:16]
+
+
+def token_for(user):
+    """A refresh token whose access tokens authenticate without a user query."""
+    token = RefreshToken.for_user(user)
+    token[VERSION_CLAIM] = auth_version(user.password, user.is_active, user.token_generation)
+    return token
+
+
+def forget(user_id):
+    cache.delete(CACHE_KEY.format(user_id))
+
+
+def cached_entry(user_id):
+    key = CACHE_KEY.format(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        row = get_user_model().objects.filter(pk=user_id).values(
+            'username', 'is_active', 'password', 'token_generation',
+        ).first()
+        if row is None:
+            return None
+        entry = {
+            'username': row['username'],
+            'is_active': row['is_active'],
+            'version': auth_version(row['password'], row['is_active'], row['token_generation']),
+        }
+        cache.set(key, entry, timeout=getattr(settings, 'AUTH_USER_CACHE_TTL', 300))
+    return entry
+
+
+def lazy_user(user_id, entry):
+    """A user instance with only id/username/is_active loaded; the rest is deferred."""
+    User = get_user_model()
+    known = {User._meta.pk.attname: user_id, 'username': entry['username'], 'is_active': entry['is_active']}
+    return User.from_db(None, list(known), list(known.values()))
+
+
+def verify(validated_token):
+    """
+    Return ``(user_id, entry)`` for a token whose ``auth_version`` still
+    matches the user, raising ``AuthenticationFailed`` otherwise.
+    """
+    try:
+        user_id = get_user_model()._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+    except (KeyError, ValidationError):
+        raise AuthenticationFailed('Token contained no recognizable user identification', code='token_not_valid')
+
+    if VERSION_CLAIM not in validated_token:
+        raise AuthenticationFailed('Token is no longer valid', code='token_not_valid')
+    entry = cached_entry(user_id)
+    if entry is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    if not entry['is_active']:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    if entry['version'] != validated_token[VERSION_CLAIM]:
+        raise AuthenticationFailed('Token is no longer valid', code='token_not_valid')
+    return user_id, entry
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        return lazy_user(*verify(validated_token))
@@ -0,0 +1,326 @@
+"""
+Streaming catalog import/export (``import_catalog`` / ``export_catalog``).
+
+A catalog file is CSV (header row) or NDJSON (one object per line) with the
+columns in ``COLUMNS``. Products are keyed on ``sku``: rows are read lazily
+and upserted in batches, each batch costing one SELECT of the existing SKUs,
+one ``bulk_create``, one ``bulk_update`` and the search index refresh, so
+memory stays constant whatever the file size. Categories and subcategories
+are resolved through an in-memory name -> row map that is loaded once and
+extended as new names appear.
+
+``image`` is a file name inside ``--images`` (copied into ``MEDIA_ROOT``
+unless a file with that name is already stored) or, without ``--images``, a
+storage name as written by the export. Variants are not generated inline;
+run ``generate_image_variants`` after a large import.
+"""
+import csv
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.validators import DecimalValidator
+from django.db import transaction
+from django.utils import timezone
+
+from . import category_tree, response_cache, search
+from .models import Category, Product, SubCategory
+
+COLUMNS = (
+    'sku', 'name', 'description', 'cost', 'discount', 'weight', 'weight_unit', 'stock',
+    'category', 'subcategory', 'image',
+)
+UPDATED_FIELDS = (
+    'name', 'description', 'cost', 'discount', 'weight', 'weight_unit', 'stock',
+    'subcategory', 'category', 'image',
+)
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+IMAGE_DIR = 'product_images'
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+def guess_format(path, default='csv'):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line number, row dict)`` from an open text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as exc:
+                yield line_number, RowError(f'invalid JSON: {exc}')
+
+
+def write_rows(rows, stream, fmt):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def _text(row, name, required=False, max_length=None):
+    value = row.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{name} is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def _decimal(row, name, default=None):
+    value = _text(row, name)
+    if not value:
+        if default is None:
+            raise RowError(f'{name} is required')
+        return default
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f'{name} is not a number: {value!r}')
+    if not number.is_finite():
+        raise RowError(f'{name} is not a number: {value!r}')
+    # checked here: an out of range value would fail the whole batch's INSERT/UPDATE
+    model_field = Product._meta.get_field(name)
+    try:
+        DecimalValidator(model_field.max_digits, model_field.decimal_places)(number)
+    except ValidationError as exc:
+        raise RowError(f'{name} {value!r}: {" ".join(exc.messages)}')
+    return number
+
+
+def _stock(row):
+    value = _text(row, 'stock')
+    if not value:
+        return None
+    if not value.isdigit():
+        raise RowError(f'stock is not a non-negative integer: {value!r}')
+    return int(value)
+
+
+def parse_row(row):
+    """Validate one raw row; returns a dict of model values plus the taxonomy names."""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError(f'expected a JSON object, not {type(row).__name__}')
+    weight_unit = _text(row, 'weight_unit') or 'kg'
+    if weight_unit not in ('kg', 'dona'):
+        raise RowError(f'weight_unit must be kg or dona, not {weight_unit!r}')
+    return {
+        'sku': _text(row, 'sku', required=True, max_length=64),
+        'name': _text(row, 'name', required=True, max_length=255),
+        'description': _text(row, 'description'),
+        'cost': _decimal(row, 'cost'),
+        'discount': _decimal(row, 'discount', Decimal('0')),
+        'weight': _decimal(row, 'weight', Decimal('0')),
+        'weight_unit': weight_unit,
+        'stock': _stock(row),
+        'category': _text(row, 'category', required=True, max_length=100),
+        'subcategory': _text(row, 'subcategory', required=True, max_length=100),
+        'image': _text(row, 'image'),
+    }
+
+
+class Taxonomy:
+    """Category/subcategory names -> rows, loaded once and created on demand."""
+
+    def __init__(self):
+        self.categories = {category.name: category for category in Category.objects.all()}
+        by_id = {category.pk: category for category in self.categories.values()}
+        self.subcategories = {}
+        for subcategory in SubCategory.objects.all():
+            subcategory.category = by_id[subcategory.category_id]
+            self.subcategories[(subcategory.category_id, subcategory.name)] = subcategory
+        self.created = False
+
+    def subcategory(self, category_name, subcategory_name):
+        category = self.categories.get(category_name)
+        if category is None:
+            category = self.categories[category_name] = Category.objects.create(name=category_name)
+            self.created = True
+        key = (category.pk, subcategory_name)
+        subcategory = self.subcategories.get(key)
+        if subcategory is None:
+            subcategory = self.subcategories[key] = SubCategory.objects.create(
+                category=category, name=subcategory_name,
+            )
+            self.created = True
+        return subcategory
+
+
+class ImageStore:
+    def __init__(self, directory=None):
+        self.directory = os.path.realpath(directory) if directory else None
+
+    def attach(self, name):
+        if not name or self.directory is None:
+            return name
+        source = os.path.realpath(os.path.join(self.directory, name))
+        if not source.startswith(self.directory + os.sep) or not os.path.isfile(source):
+            raise RowError(f'image not found in the images directory: {name!r}')
+        stored = f'{IMAGE_DIR}/{os.path.basename(source)}'
+        if default_storage.exists(stored):
+            return stored
+        with open(source, 'rb') as f:
+            return default_storage.save(stored, File(f))
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / max(self.elapsed, 1e-9)
+
+    def fail(self, line_number, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line_number}: {error}')
+
+
+def import_rows(rows, images=None, batch_size=1000, progress=None):
+    """
+    Upsert ``(line number, raw row)`` pairs in batches. ``progress`` is called
+    with the running ``ImportStats`` after every batch.
+    """
+    stats = ImportStats()
+    taxonomy = Taxonomy()
+    image_store = ImageStore(images)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        _import_batch(batch, taxonomy, image_store, stats)
+        if progress:
+            progress(stats)
+    if taxonomy.created:
+        category_tree.invalidate()
+    return stats
+
+
+def _import_batch(batch, taxonomy, image_store, stats):
+    stats.rows += len(batch)
+    parsed = {}
+    for line_number, raw in batch:
+        try:
+            values = parse_row(raw)
+            values['subcategory'] = taxonomy.subcategory(values.pop('category'), values['subcategory'])
+            values['category'] = values['subcategory'].category
+            values['image'] = image_store.attach(values['image'])
+        except RowError as exc:
+            stats.fail(line_number, exc)
+            continue
+        if values['sku'] in parsed:
+            stats.duplicates += 1  # a later row for the same SKU wins
+        parsed[values['sku']] = values
+
+    with transaction.atomic():
+        existing = Product.objects.in_bulk(list(parsed), field_name='sku')
+        to_create, to_update = [], []
+        left_categories = set()  # categories whose lists lose a product
+        now = timezone.now()
+        for sku, values in parsed.items():
+            product = existing.get(sku)
+            if product is None:
+                to_create.append(Product(**values))
+                continue
+            if _unchanged(product, values):
+                stats.unchanged += 1
+                continue
+            if product.category_id != values['category'].pk:
+                left_categories.add(product.category_id)
+            for name in UPDATED_FIELDS:
+                setattr(product, name, values[name])
+            product.updated_at = now
+            to_update.append(product)
+
+        Product.objects.bulk_create(to_create)
+        if to_create and to_create[0].pk is None:  # MySQL returns no ids
+            ids = dict(Product.objects.filter(sku__in=[p.sku for p in to_create]).values_list('sku', 'pk'))
+            for product in to_create:
+                product.pk = ids[product.sku]
+        Product.objects.bulk_update(to_update, [*UPDATED_FIELDS, 'updated_at'])
+        search.index_products(to_create + to_update)
+
+        changed = to_create + to_update
+        if changed:
+            categories = left_categories.union(product.category_id for product in changed)
+            response_cache.invalidate(
+                'products',
+                *(f'products:category:{category_id}' for category_id in categories),
+                *(f'product:{product.pk}' for product in to_update),
+            )
+            transaction.on_commit(category_tree.invalidate)
+    stats.created += len(to_create)
+    stats.updated += len(to_update)
+
+
+def _unchanged(product, values):
+    for name in UPDATED_FIELDS:
+        if name in ('subcategory', 'category'):
+            if getattr(product, f'{name}_id') != values[name].pk:
+                return False
+        elif getattr(product, name) != values[name]:
+            return False
+    return True
+
+
+def export_rows(queryset=None, batch_size=1000):
+    """Yield catalog rows in ``pk`` order, reading one keyset batch at a time."""
+    queryset = (queryset if queryset is not None else Product.objects.all()).select_related(
+        'subcategory__category',
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        for product in batch:
+            yield {
+                'sku': product.sku or '',
+                'name': product.name,
+                'description': product.description,
+                'cost': str(product.cost),
+                'discount': str(product.discount),
+                'weight': '' if product.weight is None else str(product.weight),
+                'weight_unit': product.weight_unit or '',
+                'stock': '' if product.stock is None else product.stock,
+                'category': product.subcategory.category.name,
+                'subcategory': product.subcategory.name,
+                'image': product.image.name or '',
+            }
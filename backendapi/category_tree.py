@@ -0,0 +1,138 @@
+"""
+Prebuilt category -> subcategory tree served by ``/api/categories/tree/``.
+
+The whole tree is rendered to JSON once and kept in the default cache
+together with an ETag derived from its content. The entry's key carries a
+version number that model signals bump whenever a category, subcategory or
+product changes, and the next request rebuilds it with two queries. A tree
+built from data read before a change can therefore only be stored under the
+old version, where nobody looks for it again. Image URLs are stored MEDIA_URL-relative so
+the document does not depend on the request host.
+
+In multi-process deployments the default cache must be shared between
+workers (Redis, memcached, file based): the version lives in that cache,
+so with the per-process locmem backend only the worker that handled the
+write sees the invalidation. There trees are kept for
+``LOCAL_TREE_TIMEOUT`` only, which bounds how long other workers can serve
+a stale tree.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+
+from . import images
+from .models import Category, SubCategory
+
+CACHE_KEY = 'backendapi:category_tree:{}'
+VERSION_KEY = 'backendapi:category_tree:version'
+# trees of superseded versions are never read again; let them expire
+TREE_TIMEOUT = 60 * 60 * 24
+# locmem: other workers never see our invalidations
+LOCAL_TREE_TIMEOUT = 60
+
+
+def _image_url(image):
+    return image.url if image else None
+
+
+def _subcategories():
+    return SubCategory.objects.annotate(product_count=Count('products')).order_by('name', 'id')
+
+
+def _categories():
+    return Category.objects.order_by('name', 'id')
+
+
+def build():
+    """Build the tree document from the database and return ``(etag, body)``."""
+    return render(list(_categories()), list(_subcategories()))
+
+
+async def abuild():
+    return render([category async for category in _categories()], [sub async for sub in _subcategories()])
+
+
+def render(category_rows, subcategory_rows):
+    subcategories = {}
+    for subcategory in subcategory_rows:
+        subcategories.setdefault(subcategory.category_id, []).append({
+            'id': subcategory.id,
+            'name': subcategory.name,
+            'description': subcategory.description,
+            'image': _image_url(subcategory.image),
+            'image_srcset': images.variant_urls(subcategory.image_variants),
+            'product_count': subcategory.product_count,
+        })
+
+    categories = []
+    for category in category_rows:
+        children = subcategories.get(category.id, [])
+        categories.append({
+            'id': category.id,
+            'name': category.name,
+            'description': category.description,
+            'image': _image_url(category.image),
+            'image_srcset': images.variant_urls(category.image_variants),
+            'product_count': sum(child['product_count'] for child in children),
+            'subcategories': children,
+        })
+
+    body = json.dumps({'categories': categories}, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+    return etag, body
+
+
+def tree_timeout():
+    return LOCAL_TREE_TIMEOUT if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache) else TREE_TIMEOUT
+
+
+def _initial_version():
+    # time based, so a version key that was evicted never comes back as an old number
+    return time.time_ns()
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        cache.add(VERSION_KEY, _initial_version(), timeout=None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+async def aversion():
+    current = await cache.aget(VERSION_KEY)
+    if current is None:
+        await cache.aadd(VERSION_KEY, _initial_version(), timeout=None)
+        current = await cache.aget(VERSION_KEY)
+    return current
+
+
+def get():
+    """Return the cached ``(etag, body)``, rebuilding it on a miss."""
+    key = CACHE_KEY.format(version())
+    tree = cache.get(key)
+    if tree is None:
+        tree = build()
+        cache.set(key, tree, timeout=tree_timeout())
+    return tree
+
+
+async def aget():
+    key = CACHE_KEY.format(await aversion())
+    tree = await cache.aget(key)
+    if tree is None:
+        tree = await abuild()
+        await cache.aset(key, tree, timeout=tree_timeout())
+    return tree
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # never read or evicted: the next read starts a new version
+        pass
@@ -0,0 +1,117 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304) for read endpoints.
+
+Detail validators are computed from ``updated_at`` columns with a single
+``values_list`` query, so an unchanged resource is answered with 304 without
+loading or serializing it. List validators are computed from the page that
+is about to be rendered (its rows' ids and timestamps plus the pagination
+envelope), so a 304 costs the page query but never an aggregate over the
+table.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified handling to ``list`` and ``retrieve``.
+
+    ``conditional_timestamps`` lists the ``updated_at`` style fields whose
+    change must invalidate the representation, including those of nested
+    relations (which the queryset must ``select_related``). Lists only carry
+    an ETag: a deleted row does not move any timestamp, so
+    ``If-Modified-Since`` alone cannot be trusted there, but the ids and the
+    pagination envelope (count, links) folded into the ETag catch it.
+
+    ``alist``/``aretrieve`` are the same for the async read path (see
+    ``backendapi.async_views``).
+    """
+    conditional_timestamps = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.conditional_list(request, list(queryset) if page is None else page, page is not None)
+
+    def retrieve(self, request, *args, **kwargs):
+        row = self.timestamps_query(kwargs).first()
+        if row is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag, last_modified = self.detail_validators(request, row)
+        return self.conditional_response(request, etag, last_modified, super().retrieve, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        rows = [obj async for obj in queryset] if page is None else page
+        return self.conditional_list(request, rows, page is not None)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        row = await self.timestamps_query(kwargs).afirst()
+        if row is None:
+            return await super().aretrieve(request, *args, **kwargs)
+        etag, last_modified = self.detail_validators(request, row)
+        return await self.aconditional_response(request, etag, last_modified, super().aretrieve, *args, **kwargs)
+
+    def conditional_list(self, request, rows, paginated):
+        """``ListModelMixin.list`` for already fetched ``rows``, answering 304 before serializing."""
+        envelope = self.get_paginated_response([]).data if paginated else None
+        etag = self.list_etag(request, rows, envelope)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data = self.get_serializer(rows, many=True).data
+            response = self.get_paginated_response(data) if paginated else Response(data)
+        return self.add_validators(response, etag, None)
+
+    def list_etag(self, request, rows, envelope=None):
+        return self.make_etag(request, envelope, [
+            (row.pk, *(self.row_timestamp(row, field) for field in self.conditional_timestamps)) for row in rows
+        ])
+
+    @staticmethod
+    def row_timestamp(row, field):
+        for name in field.split('__'):
+            row = getattr(row, name, None)
+        return row
+
+    def timestamps_query(self, kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return (
+            self.filter_queryset(self.get_queryset())
+            .filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+            .values_list(*self.conditional_timestamps)
+        )
+
+    def detail_validators(self, request, row):
+        timestamps = [ts for ts in row if ts is not None]
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        return self.make_etag(request, *row), last_modified
+
+    @staticmethod
+    def make_etag(request, *parts):
+        key = repr((request.get_full_path(), request.headers.get('Accept', ''), parts))
+        return '"%s"' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def conditional_response(self, request, etag, last_modified, render, *args, **kwargs):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = render(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    async def aconditional_response(self, request, etag, last_modified, render, *args, **kwargs):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await render(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    @staticmethod
+    def add_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,110 @@
+"""
+``Idempotency-Key`` handling for order submission.
+
+The first request with a given key inserts an ``IdempotencyKey`` row; the
+unique ``(user, key)`` constraint makes that insert the serialization point,
+so a concurrent duplicate fails to claim the key and gets 409 instead of
+creating a second order. Once the order is committed, retries replay the
+stored status code and body of the first response, not the order's current
+state.
+Only successful submissions are remembered: a request that fails validation
+or errors releases the key so the client can retry.
+
+Keys live for ``IDEMPOTENCY_KEY_TTL`` seconds. Expired rows are replaced on
+reuse and removed in bulk by ``manage.py purge_idempotency_keys``. A claim
+left behind by a worker that died mid-request is taken over after
+``IDEMPOTENCY_LOCK_TIMEOUT`` seconds.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request body.'
+    default_code = 'idempotency_key_mismatch'
+
+
+class InvalidIdempotencyKey(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters.'
+    default_code = 'invalid_idempotency_key'
+
+
+def request_hash(data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def claim(user, key, data):
+    """
+    Claim ``key`` for ``user``. Returns the new in-flight record, or the
+    completed record whose response should be replayed.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise InvalidIdempotencyKey()
+    fingerprint = request_hash(data)
+    now = timezone.now()
+
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if existing is None:
+            continue  # released between our insert and our read
+        stale = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        if existing.expires_at <= now or (existing.status_code is None and existing.created_at <= stale):
+            # compare-and-delete so two takers cannot both remove a fresh claim
+            IdempotencyKey.objects.filter(pk=existing.pk, created_at=existing.created_at).delete()
+            continue
+        if existing.request_hash != fingerprint:
+            raise IdempotencyKeyMismatch()
+        if existing.status_code is None:
+            raise IdempotencyConflict()
+        return existing
+    raise IdempotencyConflict()
+
+
+def complete(record, order_id, status_code, body):
+    IdempotencyKey.objects.filter(pk=record.pk).update(order_id=order_id, status_code=status_code, response_body=body)
+
+
+def release(record):
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches; returns the number of rows removed."""
+    removed = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,149 @@
+"""
+Resized WebP/JPEG derivatives of uploaded product and category images.
+
+When a model with an ``image`` / ``image_variants`` pair is saved with a new
+image, a job is queued after commit on a small in-process thread pool, so
+the upload request never waits on Pillow. The job writes one WebP and one
+JPEG per width in ``IMAGE_VARIANT_WIDTHS`` next to the original, with
+content-hashed names, and records them in ``image_variants``::
+
+    {"source": "product_images/a.jpg",
+     "webp": {"320": "product_images/variants/a.1f2e3d4c.320w.webp", ...},
+     "jpeg": {"320": "product_images/variants/a.1f2e3d4c.320w.jpg", ...}}
+
+``manage.py generate_image_variants`` backfills rows that predate this or
+whose job was lost when a worker restarted.
+"""
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import response_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (160, 320, 640, 1024)
+FORMATS = {
+    'webp': ('WEBP', '.webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-variants')
+
+
+def variant_widths():
+    return tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_WIDTHS))
+
+
+def needs_variants(instance):
+    return bool(instance.image) and instance.image_variants.get('source') != instance.image.name
+
+
+def schedule(instance):
+    """Generate variants for ``instance`` once the current transaction commits."""
+    label, pk = instance._meta.label, instance.pk
+    if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_run_job, label, pk))
+    else:
+        transaction.on_commit(lambda: generate_for(label, pk))
+
+
+def _run_job(label, pk):
+    close_old_connections()
+    try:
+        generate_for(label, pk)
+    except Exception:
+        logger.exception("Image variant generation failed for %s %s", label, pk)
+    finally:
+        close_old_connections()
+
+
+def generate_for(label, pk):
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not instance.image:
+        return
+    if not instance.image.storage.exists(instance.image.name):
+        logger.warning("Skipping image variants for %s %s: %s is missing", label, pk, instance.image.name)
+        return
+    generate(instance)
+
+
+def generate(instance):
+    """
+    Write the variants of ``instance.image`` and store their names on the row.
+
+    The row is updated with ``QuerySet.update`` so saving the variant map does
+    not re-trigger the post_save handlers, but ``updated_at`` is bumped so
+    conditional GET validators pick up the new payload.
+    """
+    with instance.image.open('rb') as source:
+        data = source.read()
+    digest = hashlib.sha1(data).hexdigest()[:8]
+
+    with Image.open(BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        variants = {'source': instance.image.name}
+        variants.update(_write_variants(original, instance.image.name, digest))
+
+    stale = _stored_names(instance.image_variants) - _stored_names(variants)
+    model = type(instance)
+    model.objects.filter(pk=instance.pk).update(image_variants=variants, updated_at=timezone.now())
+    instance.image_variants = variants
+    for name in stale:
+        default_storage.delete(name)
+    response_cache.invalidate(f'{model._meta.model_name}:{instance.pk}')
+    if model._meta.model_name in ('category', 'subcategory'):
+        from . import category_tree
+        category_tree.invalidate()
+    return variants
+
+
+def _write_variants(original, source_name, digest):
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    has_alpha = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+
+    widths = [width for width in variant_widths() if width < original.width] or [original.width]
+    written = {key: {} for key in FORMATS}
+    for width in widths:
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        for key, (pil_format, extension, options) in FORMATS.items():
+            image = resized
+            if pil_format == 'JPEG' or not has_alpha:
+                image = resized.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **options)
+            name = posixpath.join(directory, 'variants', f'{stem}.{digest}.{width}w{extension}')
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            written[key][str(width)] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return written
+
+
+def _stored_names(variants):
+    return {name for key in FORMATS for name in (variants or {}).get(key, {}).values()}
+
+
+def variant_urls(variants, build_url=None):
+    """Map the stored variant names to URLs: ``{"webp": {"320": url}, ...}``."""
+    urls = {}
+    for key in FORMATS:
+        names = (variants or {}).get(key)
+        if names:
+            urls[key] = {
+                width: build_url(default_storage.url(name)) if build_url else default_storage.url(name)
+                for width, name in names.items()
+            }
+    return urls
@@ -0,0 +1,132 @@
+"""
+Stock levels and checkout reservations.
+
+``Product.stock`` is the quantity still available; ``None`` means the
+product is not stock-tracked. Checkout reserves stock for all lines of an
+order with a single conditional statement::
+
+    UPDATE product SET stock = stock - CASE id WHEN .. THEN .. END
+     WHERE id IN (..) AND (stock IS NULL OR stock >= CASE id WHEN .. END)
+
+No row is read and locked beforehand. The UPDATE touches rows in primary
+key order and runs before the order and its items are inserted (the item
+inserts take shared foreign key locks on the same product rows), so
+concurrent checkouts of the same SKUs queue on the row locks instead of
+deadlocking; the locks are held until the order's transaction commits. If
+any line is short, nothing is reserved and the order is rejected.
+
+A reservation is returned to stock when the order is cancelled, or when a
+still ``Pending`` order is older than ``STOCK_RESERVATION_TTL`` and
+``manage.py release_expired_reservations`` runs.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import analytics, response_cache
+from .models import Order, OrderItem, Product
+
+PENDING = 'Pending'
+CANCELLED = 'Cancelled'
+EXPIRED = 'Expired'
+
+
+class _Shortage(Exception):
+    pass
+
+
+def reservation_deadline():
+    return timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def reserve(items):
+    """
+    Take the quantities of ``items`` (OrderItems or ``(product_id, quantity)``
+    pairs) out of stock in one statement, or raise ``ValidationError``
+    naming the lines that cannot be fulfilled.
+    """
+    quantities = Counter()
+    for product_id, quantity in _pairs(items):
+        quantities[product_id] += quantity
+    if not quantities:
+        return
+
+    needed = _quantity_case(quantities)
+    try:
+        with transaction.atomic():
+            updated = (
+                Product.objects.filter(pk__in=quantities)
+                .filter(Q(stock__isnull=True) | Q(stock__gte=needed))
+                .update(stock=F('stock') - needed, updated_at=Now())
+            )
+            if updated != len(quantities):
+                raise _Shortage()
+            response_cache.invalidate(*(f'product:{product_id}' for product_id in quantities))
+    except _Shortage:
+        available = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'stock'))
+        raise serializers.ValidationError({'items': [
+            {'quantity': [f'Only {available[product_id]} left in stock.']}
+            if available.get(product_id) is not None and available[product_id] < quantities[product_id] else {}
+            for product_id, _ in _pairs(items)
+        ]})
+
+
+def release(order, status=CANCELLED):
+    """
+    Return the stock held by a still pending ``order`` and set its status.
+    Safe to call concurrently or repeatedly: only the caller that flips
+    ``stock_reserved`` gives the stock back, and an order that is no longer
+    pending (delivered, or cancelled/expired meanwhile) is left alone.
+    Returns whether stock was released.
+    """
+    with transaction.atomic():
+        # status changes on both paths below
+        transaction.on_commit(lambda: analytics.sync(order.pk), robust=True)
+        pending = Order.objects.filter(pk=order.pk, status=PENDING)
+        claimed = pending.filter(stock_reserved=True).update(stock_reserved=False, status=status)
+        if not claimed:
+            pending.update(status=status)
+            return False
+
+        quantities = Counter()
+        for product_id, quantity in OrderItem.objects.filter(order_id=order.pk).values_list('product_id', 'quantity'):
+            quantities[product_id] += quantity
+        if quantities:
+            Product.objects.filter(pk__in=quantities, stock__isnull=False).update(
+                stock=F('stock') + _quantity_case(quantities), updated_at=Now(),
+            )
+            response_cache.invalidate(*(f'product:{product_id}' for product_id in quantities))
+    return True
+
+
+def release_expired(batch_size=500):
+    """Release reservations of pending orders past their deadline; returns the count."""
+    released = 0
+    expired = Order.objects.filter(status=PENDING, stock_reserved=True, reserved_until__lt=timezone.now())
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return released
+        for pk in batch:
+            released += release(Order(pk=pk), status=EXPIRED)
+
+
+def _pairs(items):
+    for item in items:
+        if isinstance(item, OrderItem):
+            yield item.product_id, item.quantity
+        else:
+            yield item
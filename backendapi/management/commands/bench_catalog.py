@@ -0,0 +1,162 @@
+import http.client
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = {
+    'sync': ('storebackend.wsgi:application', 'sync', {}),
+    'async': ('storebackend.asgi:application', 'uvicorn.workers.UvicornWorker', {'ASYNC_CATALOG_READS': '1'}),
+}
+LATENCY_ENV = 'BENCH_CATALOG_DB_LATENCY'
+
+
+def post_worker_init(worker):
+    """gunicorn hook (this module is the servers' config): delay every query by ``LATENCY_ENV`` ms."""
+    delay = float(os.environ.get(LATENCY_ENV) or 0) / 1000
+    if not delay:
+        return
+    from django.db.backends.signals import connection_created
+
+    def slow(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def wrap(sender, connection, **kwargs):
+        # a thread's connection object is reused for each new database connection
+        if slow not in connection.execute_wrappers:
+            connection.execute_wrappers.append(slow)
+
+    connection_created.connect(wrap, weak=False)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the catalog with sync gunicorn workers and with uvicorn workers (async catalog reads) "
+        "at the same worker count, drive both with concurrent GETs and report throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--workers', type=int, default=3)
+        parser.add_argument('--concurrency', type=int, default=32, help="Client connections.")
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--db-latency', type=float, default=0.0,
+                            help="Milliseconds added to every query in the servers, to model a remote database.")
+        parser.add_argument('--uncached', action='store_true',
+                            help="Make every URL unique so no request is answered from the response cache.")
+
+    def handle(self, *args, **options):
+        paths = self.paths()
+        self.stdout.write(
+            f"{len(paths)} URLs, {options['workers']} workers, {options['concurrency']} connections, "
+            f"{options['seconds']:.0f}s, db latency {options['db_latency']:g} ms"
+            f"{', uncached' if options['uncached'] else ''}"
+        )
+        for mode in options['modes']:
+            server = self.start(mode, options)
+            try:
+                result = self.load(paths, options)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            self.report(mode, result, options['seconds'])
+
+    def paths(self):
+        # imported here: gunicorn loads this module as its config before Django is set up
+        from backendapi.models import Category, Product
+
+        products = list(Product.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[:200])
+        categories = list(Category.objects.values_list('pk', flat=True)[:20])
+        if not products or not categories:
+            raise CommandError("No catalog to benchmark; run seed_data first.")
+        paths = ['/api/products/', '/api/products/?pagination=cursor', '/api/categories/', '/api/categories/tree/']
+        paths += [f'/api/products/?page={page}' for page in range(2, 6)]
+        paths += [f'/api/products/?category_id={pk}' for pk in categories]
+        paths += [f'/api/products/{pk}/' for pk in products]
+        paths += [f'/api/categories/{pk}/' for pk in categories]
+        return paths
+
+    def start(self, mode, options):
+        app, worker_class, env = MODES[mode]
+        env = dict(os.environ, **env, **{LATENCY_ENV: str(options['db_latency'])})
+        server = subprocess.Popen([
+            sys.executable, '-m', 'gunicorn', app,
+            '-c', f'python:{__name__}',
+            '--bind', f"127.0.0.1:{options['port']}",
+            '--workers', str(options['workers']),
+            '--worker-class', worker_class,
+            '--log-level', 'warning',
+        ], cwd=settings.BASE_DIR, env=env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"{mode} server exited with {server.returncode}")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=5)
+                connection.request('GET', '/api/categories/')
+                if connection.getresponse().status == 200:
+                    connection.close()
+                    return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"{mode} server did not start")
+
+    def load(self, paths, options):
+        latencies, errors = [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+        counter = iter(range(sys.maxsize))
+
+        def client(seed):
+            rng = random.Random(seed)
+            connection = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=60)
+            mine, failed = [], 0
+            while time.monotonic() < deadline:
+                path = rng.choice(paths)
+                if options['uncached']:
+                    path += ('&' if '?' in path else '?') + f'bench={next(counter)}'
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        failed += 1
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    connection.close()
+                    continue
+                mine.append(time.perf_counter() - started)
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(latencies), sum(errors)
+
+    def report(self, mode, result, seconds):
+        latencies, errors = result
+        if not latencies:
+            self.stderr.write(f"{mode}: no successful requests ({errors} errors)")
+            return
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode:>5}: {len(latencies) / seconds:8.1f} req/s  p50 {percentile(0.5):7.1f} ms  "
+            f"p99 {percentile(0.99):7.1f} ms  errors {errors}"
+        ))
@@ -0,0 +1,61 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from backendapi.views import MyTokenObtainPairView
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure logins/sec of the login view in this single process (one sync worker) "
+        "and how many password hashes each login costs. Runs in a rolled back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--phone', action='store_true', help="Log in with raqam instead of username.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def run(self, options):
+        user = get_user_model().objects.create_user(
+            username='bench-login-user', raqam='+998000000000', password='bench-password-123',
+        )
+        login = user.raqam if options['phone'] else user.username
+        view = MyTokenObtainPairView.as_view()
+        factory = APIRequestFactory()
+        hasher = get_hasher()
+
+        with mock.patch.object(type(hasher), 'encode', autospec=True, side_effect=type(hasher).encode) as encode:
+            logins = 0
+            started = time.perf_counter()
+            deadline = started + options['seconds']
+            while time.perf_counter() < deadline:
+                request = factory.post('/api/login/', {'username': login, 'password': 'bench-password-123'},
+                                       format='json')
+                response = view(request)
+                if response.status_code != 200:
+                    self.stderr.write(f"Login failed: {response.status_code} {response.data}")
+                    return
+                logins += 1
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"hasher:            {hasher.algorithm} ({getattr(hasher, 'iterations', '-')} iterations)")
+        self.stdout.write(f"logins:            {logins} in {elapsed:.2f}s")
+        self.stdout.write(f"hashes per login:  {encode.call_count / logins:.2f}")
+        self.stdout.write(self.style.SUCCESS(f"logins/sec/worker: {logins / elapsed:.1f}"))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backendapi import catalog
+
+
+class Command(BaseCommand):
+    help = "Stream the product catalog to a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout (default).")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help="Defaults to the file extension (.csv, .ndjson/.jsonl), csv for stdout.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or catalog.guess_format(path)
+        try:
+            stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        started = time.monotonic()
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        try:
+            catalog.write_rows(counted(catalog.export_rows(batch_size=options['batch_size'])), stream, fmt)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(f"Exported {count} products in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s).")
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from backendapi import catalog, order_export
+
+
+class Command(BaseCommand):
+    help = "Stream the orders placed in a date range, with items, address and payments, to CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout (default).")
+        parser.add_argument('--start', required=True, help="First day (YYYY-MM-DD) or ISO datetime.")
+        parser.add_argument('--end', help="Last day, inclusive, or ISO datetime (default: now).")
+        parser.add_argument('--format', choices=order_export.FORMATS,
+                            help="Defaults to the file extension (.csv, .ndjson/.jsonl), csv for stdout.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or catalog.guess_format(path)
+        try:
+            start = order_export.parse_bound(options['start'])
+            end = order_export.parse_bound(options['end'], end=True) if options['end'] else timezone.now()
+        except ValueError as exc:
+            raise CommandError(exc)
+        try:
+            stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        started = time.monotonic()
+        count = 0
+
+        def counted(records):
+            nonlocal count
+            for record in records:
+                count += 1
+                yield record
+
+        try:
+            records = order_export.export_orders(start, end, batch_size=options['batch_size'])
+            for chunk in order_export.render(counted(records), fmt):
+                stream.write(chunk)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(f"Exported {count} orders in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} orders/s).")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from backendapi import images
+from backendapi.models import Category, Product, SubCategory
+
+MODELS = {'category': Category, 'subcategory': SubCategory, 'product': Product}
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG variants for existing product and category images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), action='append',
+                            help="Limit to one model (repeatable). Defaults to all.")
+        parser.add_argument('--force', action='store_true',
+                            help="Regenerate variants even if they are up to date.")
+
+    def handle(self, *args, **options):
+        for name in options['model'] or MODELS:
+            model = MODELS[name]
+            done = failed = 0
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+            for instance in queryset.iterator(chunk_size=200):
+                if not options['force'] and not images.needs_variants(instance):
+                    continue
+                try:
+                    images.generate(instance)
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{name} {instance.pk}: {exc}")
+            self.stdout.write(self.style.SUCCESS(f"{name}: {done} generated, {failed} failed."))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backendapi import catalog
+
+
+class Command(BaseCommand):
+    help = "Upsert products (keyed on sku) from a CSV or NDJSON catalog file, streaming it in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help="Defaults to the file extension (.csv, .ndjson/.jsonl), csv for stdin.")
+        parser.add_argument('--images', help="Directory the image column is relative to.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or catalog.guess_format(path)
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        def progress(stats):
+            self.stdout.write(f"{stats.rows} rows, {stats.rate:.0f} rows/s")
+
+        with stream:
+            stats = catalog.import_rows(
+                catalog.read_rows(stream, fmt),
+                images=options['images'],
+                batch_size=options['batch_size'],
+                progress=progress,
+            )
+        for error in stats.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats.rows} rows in {stats.elapsed:.1f}s ({stats.rate:.0f} rows/s): "
+            f"{stats.created} created, {stats.updated} updated, {stats.unchanged} unchanged, "
+            f"{stats.duplicates} duplicate SKUs, {stats.failed} failed."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from backendapi import revocation
+
+
+class Command(BaseCommand):
+    help = "Delete revoked refresh tokens that have expired anyway."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = revocation.purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired revoked tokens."))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from backendapi import analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups from the order history, one day per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day, YYYY-MM-DD (default: the day of the first order).")
+        parser.add_argument('--end', help="Last day, inclusive (default: the day of the last order).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Orders whose items are read per query.")
+
+    def handle(self, *args, **options):
+        days = {}
+        for name in ('start', 'end'):
+            try:
+                days[name] = parse_date(options[name]) if options[name] else None
+            except ValueError:
+                days[name] = None
+            if options[name] and days[name] is None:
+                raise CommandError(f"--{name} is not a date: {options[name]!r}")
+
+        def progress(day):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{day} done")
+
+        started = time.monotonic()
+        count = analytics.rebuild(days['start'], days['end'], batch_size=options['batch_size'], progress=progress)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Rebuilt {count} days of sales rollups in {elapsed:.1f}s.")
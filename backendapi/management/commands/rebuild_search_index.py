@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from backendapi import search
+from backendapi.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        search.reindex_queryset(Product.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Product.objects.count()} products."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from backendapi import inventory
+
+
+class Command(BaseCommand):
+    help = "Return stock held by pending orders whose reservation has expired."
+
+    def handle(self, *args, **options):
+        released = inventory.release_expired()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired reservations."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from backendapi import response_cache
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the anonymous response cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats(reset=options['reset'])
+        lookups = stats['hit'] + stats['miss']
+        ratio = stats['hit'] / lookups if lookups else 0
+        self.stdout.write(
+            f"hits: {stats['hit']}  misses: {stats['miss']}  waited: {stats['wait']}  hit ratio: {ratio:.1%}"
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from backendapi import seed
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a synthetic catalog and order history for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--orders-per-user', type=int, default=10)
+        parser.add_argument('--items-per-order', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data.")
+
+    def handle(self, *args, **options):
+        data = seed.seed(
+            products=options['products'],
+            users=options['users'],
+            orders_per_user=options['orders_per_user'],
+            items_per_order=options['items_per_order'],
+            random_seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(data.products)} products, {len(data.users)} users and {len(data.orders)} orders "
+            f"(password: {seed.PASSWORD})."
+        ))
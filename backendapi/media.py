@@ -0,0 +1,132 @@
+"""
+Media file delivery.
+
+``MEDIA_DELIVERY`` selects how ``/media/...`` requests are answered:
+
+* ``"x-accel-redirect"`` – the view only resolves the path and returns an
+  empty response with ``X-Accel-Redirect: MEDIA_ACCEL_REDIRECT_PREFIX + path``;
+  nginx then sends the file itself (including range requests), e.g.::
+
+      location /protected-media/ {
+          internal;
+          alias /app/media/;
+      }
+
+* ``"x-sendfile"`` – the same with ``X-Sendfile: <absolute path>`` for
+  Apache mod_xsendfile / lighttpd.
+
+  Both header values are percent-encoded (UTF-8), as header values must be
+  ASCII; nginx and mod_xsendfile decode them before opening the file.
+* ``"django"`` (default) – the file is streamed in chunks by the worker,
+  with single-range ``Range`` support (206/416) and conditional GETs.
+
+Files whose names carry a content hash (the generated image variants) are
+served with a one year ``immutable`` Cache-Control, everything else with
+``MEDIA_CACHE_MAX_AGE``.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}\.')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404("Invalid path")
+    if not os.path.isfile(full_path):
+        raise Http404("File not found")
+
+    stat = os.stat(full_path)
+    last_modified = int(stat.st_mtime)
+    etag = '"%x-%x"' % (last_modified, stat.st_size)
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = getattr(settings, 'MEDIA_DELIVERY', 'django')
+        if mode == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_REDIRECT_PREFIX + path.lstrip('/'))
+        elif mode == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = quote(full_path)
+        else:
+            response = _stream_file(request, full_path, stat.st_size, content_type)
+            if response.status_code == 416:
+                return response  # not a representation of the file: no validators, not cacheable
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if HASHED_NAME.search(posixpath.basename(path)):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE', 86400))
+    return response
+
+
+def _stream_file(request, full_path, size, content_type):
+    byte_range = _parse_range(request.headers.get('Range'), size)
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(full_path, start, end - start + 1), status=206, content_type=content_type,
+        )
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _parse_range(header, size):
+    """
+    Return ``(start, end)`` for a satisfiable single range, ``False`` for an
+    unsatisfiable one and ``None`` when the whole file should be sent
+    (no header, or a multi-range/malformed header which is simply ignored).
+    """
+    match = RANGE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(full_path, offset, length):
+    with open(full_path, 'rb') as f:
+        f.seek(offset)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
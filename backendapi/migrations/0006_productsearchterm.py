@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_search_index(apps, schema_editor):
+    from backendapi.search import terms_for
+
+    Product = apps.get_model('backendapi', 'Product')
+    ProductSearchTerm = apps.get_model('backendapi', 'ProductSearchTerm')
+    terms = []
+    for product in Product.objects.select_related('subcategory__category').iterator(chunk_size=500):
+        subcategory = product.subcategory
+        weights = terms_for(product.name, product.description, subcategory.name, subcategory.category.name)
+        terms.extend(ProductSearchTerm(product=product, term=term, weight=weight) for term, weight in weights.items())
+        if len(terms) >= 1000:
+            ProductSearchTerm.objects.bulk_create(terms)
+            terms = []
+    ProductSearchTerm.objects.bulk_create(terms)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backendapi', '0005_remove_order_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='backendapi.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product'], name='search_term_product_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
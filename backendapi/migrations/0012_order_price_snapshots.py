@@ -0,0 +1,80 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:56
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+def backfill_prices(apps, schema_editor):
+    """Snapshot current product prices onto existing items; the best that history allows."""
+    Order = apps.get_model('backendapi', 'Order')
+    OrderItem = apps.get_model('backendapi', 'OrderItem')
+
+    orders = Order.objects.order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(orders.filter(pk__gt=last_pk)[:500])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        items_by_order = {}
+        items = list(OrderItem.objects.filter(order__in=batch).select_related('product'))
+        for item in items:
+            item.unit_price = item.product.cost
+            item.discount = item.product.discount
+            items_by_order.setdefault(item.order_id, []).append(item)
+        OrderItem.objects.bulk_update(items, ['unit_price', 'discount'])
+
+        for order in batch:
+            lines = items_by_order.get(order.pk, [])
+            subtotals = [item.unit_price * item.quantity for item in lines]
+            discounts = [
+                (subtotal * item.discount / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                for subtotal, item in zip(subtotals, lines)
+            ]
+            order.item_count = len(lines)
+            order.subtotal = sum(subtotals, Decimal('0.00'))
+            order.discount_total = sum(discounts, Decimal('0.00'))
+            order.total = order.subtotal - order.discount_total
+        Order.objects.bulk_update(batch, ['item_count', 'subtotal', 'discount_total', 'total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backendapi', '0011_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_categories(apps, schema_editor):
+    Product = apps.get_model('backendapi', 'Product')
+    SubCategory = apps.get_model('backendapi', 'SubCategory')
+    Product.objects.update(
+        category_id=Subquery(SubCategory.objects.filter(pk=OuterRef('subcategory_id')).values('category_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backendapi', '0013_revoked_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='backendapi.category'),
+        ),
+        migrations.RunPython(backfill_categories, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='backendapi.category'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['user', 'street', 'city'], name='address_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'payment_date', 'id'], name='payment_user_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='product_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['cost', 'id'], name='product_cost_id_idx'),
+        ),
+    ]
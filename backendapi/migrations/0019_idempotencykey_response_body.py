@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backendapi', '0018_order_status_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='response_body',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
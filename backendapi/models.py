@@ -1,3 +1,5 @@
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
@@ -5,6 +7,8 @@ from django.conf import settings
 
 class CustomUser(AbstractUser):
     raqam = models.CharField(max_length=20, unique=True, blank=True, null=True)
+    # Bumped by "log out all devices"; part of the tokens' auth_version.
+    token_generation = models.PositiveIntegerField(default=0, editable=False)
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = []
 
@@ -16,6 +20,14 @@ class CustomUser(AbstractUser):
             self.raqam = self.username  # Default to username if no raqam provided
         super().save(*args, **kwargs)
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users rebuilt from a token defer every other column; load them all
+        # on first access instead of one query per field.
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 
 class Address(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='addresses')
@@ -28,6 +40,10 @@ class Address(models.Model):
     is_default = models.BooleanField(default=False)
     is_delivery = models.BooleanField(default=True)
 
+    class Meta:
+        # narrows the get_or_create lookup at checkout to (nearly) one row
+        indexes = [models.Index(fields=['user', 'street', 'city'], name='address_lookup_idx')]
+
     def __str__(self):
         return f"{self.street}, {self.city}, {self.district}, {self.region}"
 
@@ -35,6 +51,8 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='category_images/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -44,6 +62,8 @@ class SubCategory(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='subcategory_images/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -51,6 +71,12 @@ class SubCategory(models.Model):
 
 class Product(models.Model):
     subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE, related_name='products')
+    # copied from subcategory on save so category listings are one index range
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name='products', editable=False, db_index=False,
+    )
+    # supplier stock keeping unit; the key catalog imports upsert on
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField()
     cost = models.DecimalField(max_digits=10, decimal_places=2)
@@ -58,30 +84,86 @@ class Product(models.Model):
     weight_unit = models.CharField(max_length=20, default='kg', choices=[('kg', 'Kilograms'), ('dona', 'Dona')], null=True, blank=True)
     discount = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     image = models.ImageField(upload_to='product_images/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # units available for sale; null means the product is not stock-tracked (see backendapi.inventory)
+    stock = models.PositiveIntegerField(null=True, blank=True)
     created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='product_category_created_idx'),
+            models.Index(fields=['cost', 'id'], name='product_cost_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.subcategory_id is not None:
+            self.category_id = self.subcategory.category_id
+        super().save(*args, **kwargs)
+
 class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, default='Pending')
     delivery_address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True, blank=True)
+    stock_reserved = models.BooleanField(default=False)
+    reserved_until = models.DateTimeField(null=True, blank=True, db_index=True)
+    # denormalized from the items when the order is placed
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # whether the order's lines are currently counted in the sales rollups (see backendapi.analytics)
+    sales_recorded = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'order_date', 'id'], name='order_user_date_id_idx'),
+            # date-range scans of the order export
+            models.Index(fields=['order_date', 'id'], name='order_date_id_idx'),
+            # admin status filter, newest first
+            models.Index(fields=['status', 'order_date', 'id'], name='order_status_date_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
+    def set_totals(self, items):
+        """Fill the denormalized totals from price-snapshotted ``items``."""
+        self.item_count = len(items)
+        self.subtotal = sum((item.subtotal for item in items), Decimal('0.00'))
+        self.discount_total = sum((item.discount_amount for item in items), Decimal('0.00'))
+        self.total = self.subtotal - self.discount_total
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # price and percentage discount of the product at the time of ordering
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=5, decimal_places=2, default=0)
 
     def __str__(self):
         return f"{self.quantity} of {self.product.name}"
 
+    def snapshot_price(self):
+        self.unit_price = self.product.cost
+        self.discount = self.product.discount
+
+    @property
+    def subtotal(self):
+        return self.unit_price * self.quantity
+
+    @property
+    def discount_amount(self):
+        return (self.subtotal * self.discount / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
 class Payment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -90,5 +172,114 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=50, choices=[('Karta', 'Karta'), ('Bank o\'tkazmasi', 'Bank o\'tkazmasi'), ('Naqd', 'Naqd')])
     status = models.CharField(max_length=20, default='Pending')
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'payment_date', 'id'], name='payment_user_date_id_idx')]
+
     def __str__(self):
         return f"Payment {self.id} by {self.user.username}"
+
+
+class ProductSearchTerm(models.Model):
+    """One normalized token of a product's searchable text (see ``backendapi.search``)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [models.Index(fields=['term', 'product'], name='search_term_product_idx')]
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Client supplied ``Idempotency-Key`` of an order submission.
+
+    The row is inserted before the order is created (claiming the key) and
+    completed with the resulting order and the response body in the same
+    transaction as the order itself; ``status_code`` stays null while the
+    first request is in flight.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)  # replayed as is
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'key'], name='unique_user_idempotency_key')]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+class RevokedToken(models.Model):
+    """
+    ``jti`` of a refresh token that was rotated or logged out. Rows are only
+    needed until the token would have expired anyway.
+    """
+    jti = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class SalesRollup(models.Model):
+    """
+    Daily sales totals of the orders that were not cancelled or expired,
+    maintained incrementally by ``backendapi.analytics``.
+    """
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day'], name='daily_sales_unique')]
+
+    def __str__(self):
+        return f"{self.day}: {self.revenue}"
+
+
+class CategoryDailySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'category'], name='category_daily_sales_unique')]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}: {self.revenue}"
+
+
+class SubCategoryDailySales(SalesRollup):
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE, related_name='daily_sales')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'subcategory'], name='subcategory_daily_sales_unique')]
+
+    def __str__(self):
+        return f"{self.day} {self.subcategory_id}: {self.revenue}"
+
+
+class ProductDailySales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'product'], name='product_daily_sales_unique')]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}: {self.revenue}"
@@ -0,0 +1,162 @@
+"""
+Streaming order export for operations and accounting (``/api/exports/orders/``
+and ``manage.py export_orders``).
+
+Orders placed in ``[start, end)`` are read in keyset batches over
+``(order_date, id)``; each batch costs three queries (orders with user and
+address, their items, their payments) however large the range is. Rows are
+rendered one at a time, so neither the queryset nor the output is ever held
+in memory as a whole. Keyset batches are used rather than
+``iterator(chunk_size=...)`` because the MySQL drivers buffer the whole result
+set of a query client side.
+
+NDJSON has one object per order with nested ``address``, ``items`` and
+``payments``. CSV is flat: one line per order item with the order, address
+and payment summary repeated (an order without items gets one line).
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, OrderItem, Payment
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+ORDER_COLUMNS = (
+    'order_id', 'order_date', 'status', 'user_id', 'username', 'email',
+    'item_count', 'subtotal', 'discount_total', 'total',
+)
+ADDRESS_COLUMNS = ('street', 'district', 'region', 'city', 'postal_code')
+PAYMENT_COLUMNS = ('paid_amount', 'payment_methods', 'payment_statuses')
+ITEM_COLUMNS = ('product_id', 'sku', 'product_name', 'quantity', 'unit_price', 'discount', 'line_total')
+CSV_COLUMNS = ORDER_COLUMNS + ADDRESS_COLUMNS + PAYMENT_COLUMNS + ITEM_COLUMNS
+PAID = 'Completed'
+
+
+def parse_bound(value, end=False):
+    """
+    ``YYYY-MM-DD`` or an ISO datetime as an aware datetime. A date used as the
+    end of a range includes that whole day. Raises ValueError.
+    """
+    value = (value or '').strip()
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'not a date or datetime: {value!r}')
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _orders(start, end):
+    return Order.objects.filter(order_date__gte=start, order_date__lt=end).select_related(
+        'user', 'delivery_address',
+    ).only(
+        'order_date', 'status', 'item_count', 'subtotal', 'discount_total', 'total',
+        'user__username', 'user__email', 'delivery_address',
+    ).order_by('order_date', 'pk')
+
+
+def _by_order(queryset, ids):
+    grouped = defaultdict(list)
+    for row in queryset.filter(order_id__in=ids):
+        grouped[row.order_id].append(row)
+    return grouped
+
+
+def export_orders(start, end, batch_size=1000):
+    """Yield an ``order_record`` for every order placed in ``[start, end)``."""
+    queryset = _orders(start, end)
+    items = OrderItem.objects.select_related('product').only(
+        'order', 'quantity', 'unit_price', 'discount', 'product__sku', 'product__name',
+    )
+    payments = Payment.objects.only('order', 'amount', 'payment_date', 'payment_method', 'status')
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(order_date__gt=last.order_date) | Q(order_date=last.order_date, pk__gt=last.pk))
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]
+        # grouped by hand: prefetch_related clones a queryset per order
+        ids = [order.pk for order in batch]
+        items_by_order, payments_by_order = _by_order(items, ids), _by_order(payments, ids)
+        for order in batch:
+            yield order_record(order, items_by_order[order.pk], payments_by_order[order.pk])
+
+
+def order_record(order, items, payments):
+    address = order.delivery_address
+    return {
+        'order_id': order.pk,
+        'order_date': order.order_date.isoformat(),
+        'status': order.status,
+        'user_id': order.user_id,
+        'username': order.user.username,
+        'email': order.user.email,
+        'item_count': order.item_count,
+        'subtotal': str(order.subtotal),
+        'discount_total': str(order.discount_total),
+        'total': str(order.total),
+        'address': None if address is None else {name: getattr(address, name) or '' for name in ADDRESS_COLUMNS},
+        'items': [{
+            'product_id': item.product_id,
+            'sku': item.product.sku or '',
+            'product_name': item.product.name,
+            'quantity': item.quantity,
+            'unit_price': str(item.unit_price),
+            'discount': str(item.discount),
+            'line_total': str(item.subtotal - item.discount_amount),
+        } for item in items],
+        'payments': [{
+            'payment_id': payment.pk,
+            'amount': str(payment.amount),
+            'method': payment.payment_method,
+            'status': payment.status,
+            'payment_date': payment.payment_date.isoformat(),
+        } for payment in payments],
+    }
+
+
+def csv_rows(record):
+    """Flatten one ``order_record`` into CSV rows, one per item."""
+    payments = record['payments']
+    base = {name: record[name] for name in ORDER_COLUMNS}
+    base.update(record['address'] or {name: '' for name in ADDRESS_COLUMNS})
+    base['paid_amount'] = str(sum(
+        (Decimal(payment['amount']) for payment in payments if payment['status'] == PAID), Decimal('0.00'),
+    ))
+    base['payment_methods'] = ';'.join(payment['method'] for payment in payments)
+    base['payment_statuses'] = ';'.join(payment['status'] for payment in payments)
+    if not record['items']:
+        return [dict(base, **{name: '' for name in ITEM_COLUMNS})]
+    return [dict(base, **item) for item in record['items']]
+
+
+class _Line:
+    """File-like object whose ``write`` hands the text back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def render(records, fmt):
+    """Yield ``records`` as text chunks, one per order."""
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Line(), fieldnames=CSV_COLUMNS)
+        yield writer.writeheader()
+        for record in records:
+            yield ''.join(writer.writerow(row) for row in csv_rows(record))
+        return
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
@@ -0,0 +1,59 @@
+"""
+EXPLAIN helpers for query-plan regression tests.
+
+``capture(callable)`` records the SELECTs a request runs, ``problems(sql,
+params)`` explains one of them on the current connection and reports full
+table scans and sorts that do not come from an index:
+
+* MySQL/MariaDB: ``type = ALL`` rows and ``Using filesort`` / ``Using
+  temporary`` in ``Extra``;
+* SQLite: ``SCAN <table>`` without an index and ``USE TEMP B-TREE``.
+
+Tables that are scanned on purpose (tiny lookup tables, whole-table
+aggregates) are passed in ``allow_scans``.
+"""
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def capture(func, *args, **kwargs):
+    """Run ``func`` and return ``(result, [sql, ...])`` of the SELECTs it issued."""
+    with CaptureQueriesContext(connection) as queries:
+        result = func(*args, **kwargs)
+    return result, [q['sql'] for q in queries.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+
+
+def explain(sql):
+    """Plan rows of ``sql`` (already interpolated, as captured) as dicts."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        else:
+            cursor.execute('EXPLAIN ' + sql)
+        columns = [column[0].lower() for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def problems(sql, allow_scans=()):
+    """Human readable list of full scans / filesorts in the plan of ``sql``."""
+    found = []
+    for row in explain(sql):
+        if connection.vendor == 'sqlite':
+            detail = row['detail']
+            scan = SQLITE_SCAN.match(detail)
+            if scan and scan.group(1) not in allow_scans:
+                found.append(f'full scan of {scan.group(1)}')
+            if 'USE TEMP B-TREE' in detail:
+                found.append(detail.lower())
+        else:
+            extra = row.get('extra') or ''
+            if row.get('type') == 'ALL' and row.get('table') not in allow_scans:
+                found.append(f"full scan of {row.get('table')}")
+            for marker in ('Using filesort', 'Using temporary'):
+                if marker in extra:
+                    found.append(f"{marker.lower()} on {row.get('table')}")
+    return found
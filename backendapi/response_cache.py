@@ -0,0 +1,321 @@
+"""
+Read-through cache for anonymous catalog responses.
+
+Rendered responses are stored under a key built from the path, the
+normalized query string, the host and the negotiated media type. Each entry
+records the time its computation started and a set of tags: the ids of the
+rendered products, subcategories and categories, plus "membership" tags for
+the lists a product may appear in (``products``, ``products:category:<id>``).
+
+Invalidation is precise and O(1) per tag: model signals store the current
+time under each affected tag, and an entry is only served while none of its
+tags was touched after its computation started. A tag missing from the cache
+(evicted or never set) is initialised to "now", so eviction can only cause
+extra misses, never stale hits.
+
+On a miss only one request per key recomputes (``cache.add`` lock); the
+others wait up to ``RESPONSE_CACHE_LOCK_WAIT`` seconds for its result before
+falling back to computing it themselves. Hits, misses and waits are counted
+in the cache (see the ``response_cache_stats`` command). The ``a``-prefixed
+twins do the same through the async cache API for the async read path.
+
+The backend is whatever ``RESPONSE_CACHE_ALIAS`` names in ``CACHES``: local
+memory on a single node, the file or Redis backend when several nodes must
+see the same entries and invalidations.
+"""
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+KEY_PREFIX = 'backendapi:responses:'
+TAG_KEY = KEY_PREFIX + 'tag:{}'
+LOCK_KEY = KEY_PREFIX + 'lock:{}'
+STAT_KEY = KEY_PREFIX + 'stats:{}'
+STATS = ('hit', 'miss', 'wait')
+REPLAYED_HEADERS = ('ETag', 'Last-Modified', 'Content-Type')
+POLL_INTERVAL = 0.05
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def make_key(request):
+    params = sorted(
+        (name, value) for name, values in request.query_params.lists() for value in values if value != ''
+    )
+    raw = repr((request.build_absolute_uri(request.path), params, request.accepted_media_type))
+    return KEY_PREFIX + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def invalidate(*tags):
+    """Mark ``tags`` as changed now and again once the transaction commits."""
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return
+
+    def touch():
+        now = time.time()
+        _cache().set_many({TAG_KEY.format(tag): now for tag in tags}, timeout=None)
+
+    touch()
+    transaction.on_commit(touch)
+
+
+def _tag_times(tags):
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    times = _cache().get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in times:
+            _cache().add(key, now, timeout=None)
+            times[key] = now
+    return times.values()
+
+
+def get(key):
+    entry = _cache().get(key)
+    if entry is None:
+        return None
+    deadline = entry['started_at'] - getattr(settings, 'RESPONSE_CACHE_CLOCK_SKEW', 1)
+    if any(changed >= deadline for changed in _tag_times(entry['tags'])):
+        return None
+    return entry
+
+
+def store(key, response, tags, started_at):
+    tags = sorted(set(tags))
+    _tag_times(tags)
+    _cache().set(key, {
+        'started_at': started_at,
+        'tags': tags,
+        'content': response.content,
+        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+    }, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+
+def acquire(key):
+    return _cache().add(LOCK_KEY.format(key), 1, timeout=getattr(settings, 'RESPONSE_CACHE_LOCK_TIMEOUT', 10))
+
+
+def release(key):
+    _cache().delete(LOCK_KEY.format(key))
+
+
+def wait(key):
+    """Poll for the entry another request is computing; None on timeout."""
+    deadline = time.monotonic() + getattr(settings, 'RESPONSE_CACHE_LOCK_WAIT', 5)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = get(key)
+        if entry is not None:
+            return entry
+        if _cache().get(LOCK_KEY.format(key)) is None:
+            return None
+    return None
+
+
+def count(name):
+    key = STAT_KEY.format(name)
+    _cache().add(key, 0, timeout=None)
+    try:
+        _cache().incr(key)
+    except ValueError:
+        pass
+
+
+def stats(reset=False):
+    keys = {name: STAT_KEY.format(name) for name in STATS}
+    values = _cache().get_many(keys.values())
+    if reset:
+        _cache().delete_many(keys.values())
+    return {name: values.get(key, 0) for name, key in keys.items()}
+
+
+async def _atag_times(tags):
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    times = await _cache().aget_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in times:
+            await _cache().aadd(key, now, timeout=None)
+            times[key] = now
+    return times.values()
+
+
+async def aget(key):
+    entry = await _cache().aget(key)
+    if entry is None:
+        return None
+    deadline = entry['started_at'] - getattr(settings, 'RESPONSE_CACHE_CLOCK_SKEW', 1)
+    if any(changed >= deadline for changed in await _atag_times(entry['tags'])):
+        return None
+    return entry
+
+
+async def astore(key, response, tags, started_at):
+    tags = sorted(set(tags))
+    await _atag_times(tags)
+    await _cache().aset(key, {
+        'started_at': started_at,
+        'tags': tags,
+        'content': response.content,
+        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+    }, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+
+async def aacquire(key):
+    return await _cache().aadd(
+        LOCK_KEY.format(key), 1, timeout=getattr(settings, 'RESPONSE_CACHE_LOCK_TIMEOUT', 10),
+    )
+
+
+async def arelease(key):
+    await _cache().adelete(LOCK_KEY.format(key))
+
+
+async def await_entry(key):
+    """``wait`` without blocking the event loop."""
+    deadline = time.monotonic() + getattr(settings, 'RESPONSE_CACHE_LOCK_WAIT', 5)
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        entry = await aget(key)
+        if entry is not None:
+            return entry
+        if await _cache().aget(LOCK_KEY.format(key)) is None:
+            return None
+    return None
+
+
+async def acount(name):
+    key = STAT_KEY.format(name)
+    await _cache().aadd(key, 0, timeout=None)
+    try:
+        await _cache().aincr(key)
+    except ValueError:
+        pass
+
+
+def replay(request, entry):
+    headers = entry['headers']
+    last_modified = parse_http_date_safe(headers['Last-Modified']) if 'Last-Modified' in headers else None
+    response = get_conditional_response(request, etag=headers.get('ETag'), last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(entry['content'])
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Serves ``list`` and ``retrieve`` of anonymous GETs from the response cache.
+
+    Views name the tags of each rendered object in ``response_cache_tags``
+    and the list membership tags of a request in ``response_cache_scope``.
+    """
+
+    def response_cache_tags(self, obj):
+        return ()
+
+    def response_cache_scope(self, request):
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(request, super().alist, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(request, super().aretrieve, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            instance = args[0]
+            self.cached_objects = list(instance) if isinstance(instance, (list, tuple)) else [instance]
+        return super().get_serializer(*args, **kwargs)
+
+    def cached_response(self, request, render, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return render(request, *args, **kwargs)
+
+        key = make_key(request)
+        entry = get(key)
+        locked = entry is None and acquire(key)
+        if entry is None and not locked:
+            count('wait')
+            entry = wait(key)
+        if entry is not None:
+            count('hit')
+            return self.replay_entry(request, entry)
+
+        count('miss')
+        try:
+            started_at = time.time()
+            self.cached_objects = []
+            response = render(request, *args, **kwargs)
+            if response.status_code == 200:
+                self.render_for_cache(request, response)
+                store(key, response, self.collect_tags(request), started_at)
+        finally:
+            if locked:
+                release(key)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def acached_response(self, request, render, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return await render(request, *args, **kwargs)
+
+        key = make_key(request)
+        entry = await aget(key)
+        locked = entry is None and await aacquire(key)
+        if entry is None and not locked:
+            await acount('wait')
+            entry = await await_entry(key)
+        if entry is not None:
+            await acount('hit')
+            return self.replay_entry(request, entry)
+
+        await acount('miss')
+        try:
+            started_at = time.time()
+            self.cached_objects = []
+            response = await render(request, *args, **kwargs)
+            if response.status_code == 200:
+                self.render_for_cache(request, response)
+                await astore(key, response, self.collect_tags(request), started_at)
+        finally:
+            if locked:
+                await arelease(key)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def replay_entry(self, request, entry):
+        response = replay(request, entry)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def collect_tags(self, request):
+        tags = list(self.response_cache_scope(request))
+        for obj in self.cached_objects:
+            tags.extend(self.response_cache_tags(obj))
+        return tags
+
+    def render_for_cache(self, request, response):
+        # What finalize_response() would do, so the bytes can be stored.
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
@@ -0,0 +1,170 @@
+"""
+Refresh-token rotation and revocation.
+
+Every refresh revokes the presented token (its ``jti`` goes into
+``RevokedToken``) and hands out a new one; logout revokes the cookie's token,
+"log out all devices" bumps the user's ``token_generation`` instead of
+revoking tokens one by one (see ``authentication.auth_version``).
+
+Checking whether a token was revoked must not cost a query per refresh, so
+each process keeps a Bloom filter of the revoked ``jti``s. A miss means "not
+revoked" and needs no database access; only a hit (a revoked token or a false
+positive, ~1%) is confirmed against the table. Other processes learn about new
+revocations through a counter in the default cache and then load only the
+rows added since their last sync; the filter is rebuilt from scratch every
+``TOKEN_REVOCATION_REBUILD_INTERVAL`` seconds, which also drops expired rows.
+
+With a per-process cache the other workers only see new revocations at the
+next rebuild. Reuse of a rotated token is still caught by the unique ``jti``
+insert in ``rotate``, which fails for a token that was already revoked.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+GENERATION_KEY = 'backendapi:revoked_tokens:generation'
+MIN_CAPACITY = 1024
+# Tolerated clock skew between the processes stamping ``created_at``
+SYNC_SLACK = timedelta(seconds=60)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.built_at = 0
+        self.synced_at = None
+        self.generation = None
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+
+    def _rebuild(self):
+        rows = list(RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', 'created_at'))
+        bloom = BloomFilter(max(MIN_CAPACITY, 2 * len(rows)))
+        for jti, _ in rows:
+            bloom.add(jti)
+        self.bloom = bloom
+        self.synced_at = max((created_at for _, created_at in rows), default=timezone.now())
+        self.built_at = time.monotonic()
+
+    def _sync(self):
+        """Add the rows other processes revoked since the last sync."""
+        rows = RevokedToken.objects.filter(created_at__gte=self.synced_at - SYNC_SLACK).values_list('jti', 'created_at')
+        for jti, created_at in rows:
+            self.bloom.add(jti)
+            self.synced_at = max(self.synced_at, created_at)
+
+    def _refresh(self):
+        generation = cache.get(GENERATION_KEY)
+        interval = getattr(settings, 'TOKEN_REVOCATION_REBUILD_INTERVAL', 3600)
+        if self.bloom is None or time.monotonic() - self.built_at > interval:
+            self._rebuild()
+        elif generation != self.generation:
+            self._sync()
+            if self.bloom.count > self.bloom.capacity:
+                self._rebuild()
+        self.generation = generation
+
+    def __contains__(self, jti):
+        with self.lock:
+            self._refresh()
+            maybe = jti in self.bloom
+        return maybe and RevokedToken.objects.filter(jti=jti).exists()
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+
+revoked = RevocationFilter()
+
+
+def _announce():
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        pass
+
+
+def revoke(token):
+    """
+    Revoke a refresh token; returns False if it had already been revoked.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(
+                jti=jti,
+                user_id=token.get(api_settings.USER_ID_CLAIM),
+                expires_at=datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc),
+            )
+    except IntegrityError:
+        return False
+    revoked.add(jti)
+    transaction.on_commit(_announce)
+    return True
+
+
+def check(token):
+    if token[api_settings.JTI_CLAIM] in revoked:
+        raise TokenError('Token is revoked')
+
+
+def rotate(token):
+    """Revoke ``token`` and turn it into a new refresh token with the same claims."""
+    check(token)
+    if not revoke(token):
+        raise TokenError('Token is revoked')
+    token.set_jti()
+    token.set_exp()
+    token.set_iat()
+    return token
+
+
+def purge_expired(batch_size=1000):
+    """Delete rows of tokens that have expired anyway; returns the number removed."""
+    removed = 0
+    while True:
+        ids = list(
+            RevokedToken.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += RevokedToken.objects.filter(pk__in=ids).delete()[0]
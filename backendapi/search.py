@@ -0,0 +1,128 @@
+"""
+Product search backed by an inverted index (``ProductSearchTerm``).
+
+Searchable text (product name and description plus subcategory and category
+names) is normalized into Latin-script tokens so that Uzbek Cyrillic and
+Latin spellings, and the different apostrophe characters used for o‘ / g‘,
+all land on the same term. Lookups are ``term LIKE 'tok%'`` range scans on
+the ``(term, product)`` index, so their cost depends on the number of
+matching terms rather than on the size of the product table.
+"""
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, Q, Sum
+from rest_framework import filters
+
+MAX_TERM_LENGTH = 64
+
+# Field weights used for ranking; a name hit outranks a description hit.
+NAME_WEIGHT = 8
+SUBCATEGORY_WEIGHT = 4
+CATEGORY_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '',
+    'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya', 'ў': 'o', 'қ': 'q',
+    'ғ': 'g', 'ҳ': 'h',
+}
+
+# o‘ / g‘ are written with many look-alike characters; drop them all.
+APOSTROPHES = re.compile(r"['`‘’ʻʼ´]")
+TOKEN = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercase, transliterate Cyrillic to Latin and strip apostrophes and accents."""
+    text = ''.join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in (text or '').lower())
+    text = APOSTROPHES.sub('', text)
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """Return the distinct normalized tokens of ``text`` in order of appearance."""
+    tokens = dict.fromkeys(token[:MAX_TERM_LENGTH] for token in TOKEN.findall(normalize(text)))
+    return list(tokens)
+
+
+def terms_for(name, description, subcategory_name, category_name):
+    """Map each token to its highest field weight for one product."""
+    weights = {}
+    for text, weight in (
+        (description, DESCRIPTION_WEIGHT),
+        (category_name, CATEGORY_WEIGHT),
+        (subcategory_name, SUBCATEGORY_WEIGHT),
+        (name, NAME_WEIGHT),
+    ):
+        for token in tokenize(text):
+            weights[token] = max(weight, weights.get(token, 0))
+    return weights
+
+
+def product_terms(product):
+    subcategory = product.subcategory
+    return terms_for(product.name, product.description, subcategory.name, subcategory.category.name)
+
+
+def index_products(products):
+    """(Re)build the index rows of ``products`` with one delete and one bulk insert."""
+    from .models import ProductSearchTerm
+
+    products = list(products)
+    if not products:
+        return
+    ProductSearchTerm.objects.filter(product__in=products).delete()
+    ProductSearchTerm.objects.bulk_create(
+        [
+            ProductSearchTerm(product=product, term=term, weight=weight)
+            for product in products
+            for term, weight in product_terms(product).items()
+        ],
+        batch_size=1000,
+    )
+
+
+def reindex_queryset(queryset, batch_size=500):
+    """Re-index a product queryset in batches (used after renames and for backfills)."""
+    queryset = queryset.select_related('subcategory__category').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        index_products(batch)
+        last_pk = batch[-1].pk
+
+
+def search_products(queryset, query):
+    """
+    Restrict ``queryset`` to products matching every token of ``query``
+    (prefix match) and order them by relevance.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+
+    conditions = [Q(search_terms__term__startswith=token) for token in tokens]
+    matches = {f'_match_{i}': Count('search_terms', filter=condition) for i, condition in enumerate(conditions)}
+    queryset = queryset.filter(reduce(or_, conditions)).annotate(
+        search_rank=Sum('search_terms__weight') + Sum('search_terms__weight', filter=Q(search_terms__term__in=tokens), default=0),
+        **matches,
+    )
+    return queryset.filter(**{f'{alias}__gt': 0 for alias in matches}).order_by('-search_rank', '-created_at')
+
+
+class ProductSearchFilter(filters.BaseFilterBackend):
+    """Drop-in replacement for ``SearchFilter`` that uses the product search index."""
+    search_param = filters.SearchFilter.search_param
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return search_products(queryset, query)
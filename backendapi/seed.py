@@ -0,0 +1,143 @@
+"""
+Synthetic catalog and order history for performance tests and local
+benchmarking (``manage.py seed_data``).
+
+Everything is written with ``bulk_create`` in a handful of statements, so a
+catalog of a few thousand products with a realistic order history is built
+in seconds on SQLite or MySQL. Rows are generated from a seeded ``Random``,
+so the same arguments always produce the same data.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import analytics, search
+from .models import Address, Category, CustomUser, Order, OrderItem, Payment, Product, SubCategory
+
+WORDS = (
+    "olma", "nok", "uzum", "anor", "shaftoli", "sut", "qatiq", "pishloq", "non", "guruch",
+    "un", "shakar", "choy", "qahva", "sharbat", "suv", "go'sht", "tovuq", "baliq", "tuxum",
+    "yog'", "tuz", "makaron", "pechenye", "shokolad", "asal", "yong'oq", "mayiz", "sabzi", "kartoshka",
+)
+DISTRICTS = ("Chilonzor", "Yunusobod", "Mirobod", "Yakkasaroy", "Shayxontohur", "Olmazor")
+PAYMENT_METHODS = ("Karta", "Bank o'tkazmasi", "Naqd")
+PASSWORD = "seed-password"
+
+
+@dataclass
+class Seeded:
+    categories: list = field(default_factory=list)
+    subcategories: list = field(default_factory=list)
+    products: list = field(default_factory=list)
+    users: list = field(default_factory=list)
+    orders: list = field(default_factory=list)
+
+
+def _insert(model, objects, batch_size=1000):
+    """
+    ``bulk_create`` that always hands back saved rows with primary keys,
+    also on MySQL where the insert does not return them.
+    """
+    before = model.objects.aggregate(last=Max("pk"))["last"] or 0
+    model.objects.bulk_create(objects, batch_size=batch_size)
+    if all(obj.pk is not None for obj in objects):
+        return objects
+    return list(model.objects.filter(pk__gt=before).order_by("pk"))
+
+
+def seed_catalog(data, rng, categories=8, subcategories=5, products=2000):
+    data.categories = _insert(Category, [
+        Category(name=f"Bo'lim {i + 1}", description=rng.choice(WORDS), image="category_images/seed.jpg")
+        for i in range(categories)
+    ])
+    data.subcategories = _insert(SubCategory, [
+        SubCategory(category=category, name=f"{category.name}.{j + 1} {rng.choice(WORDS)}",
+                    image="subcategory_images/seed.jpg")
+        for category in data.categories for j in range(subcategories)
+    ])
+    by_id = {subcategory.pk: subcategory for subcategory in data.subcategories}
+    data.products = _insert(Product, [
+        Product(
+            subcategory=subcategory,
+            category_id=subcategory.category_id,
+            name=f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i + 1}",
+            description=" ".join(rng.choices(WORDS, k=8)),
+            cost=Decimal(rng.randrange(2000, 250000, 500)),
+            discount=Decimal(rng.choice((0, 0, 0, 5, 10, 15))),
+            stock=rng.choice((None, rng.randrange(0, 500))),
+            image="product_images/seed.jpg",
+        )
+        for i, subcategory in enumerate(rng.choices(data.subcategories, k=products))
+    ])
+    for product in data.products:
+        product.subcategory = by_id[product.subcategory_id]
+    search.index_products(data.products)
+
+
+def seed_history(data, rng, users=20, orders_per_user=10, items_per_order=4):
+    password = make_password(PASSWORD)  # hashed once, shared by every seeded user
+    data.users = _insert(CustomUser, [
+        CustomUser(username=f"seed{i + 1}", raqam=f"+99890{i + 1:07d}", email=f"seed{i + 1}@example.com",
+                   password=password)
+        for i in range(users)
+    ])
+    addresses = _insert(Address, [
+        Address(user=user, street=f"{rng.choice(WORDS).capitalize()} ko'chasi {j + 1}",
+                district=rng.choice(DISTRICTS), city="Toshkent", postal_code="100000")
+        for user in data.users for j in range(2)
+    ])
+    addresses_by_user = {}
+    for address in addresses:
+        addresses_by_user.setdefault(address.user_id, []).append(address)
+
+    now = timezone.now()
+    lines = []
+    orders = []
+    for user in data.users:
+        for _ in range(orders_per_user):
+            items = [
+                OrderItem(product=product, quantity=rng.randint(1, 5), unit_price=product.cost,
+                          discount=product.discount)
+                for product in rng.sample(data.products, k=min(items_per_order, len(data.products)))
+            ]
+            order = Order(
+                user=user,
+                delivery_address=rng.choice(addresses_by_user[user.pk]),
+                status=rng.choice(("Pending", "Delivered", "Delivered", "Cancelled")),
+            )
+            order.set_totals(items)
+            orders.append(order)
+            lines.append(items)
+    data.orders = _insert(Order, orders)
+    # auto_now_add ignores the value passed in, so spread the history afterwards
+    for order in data.orders:
+        order.order_date = now - timedelta(minutes=rng.randrange(0, 60 * 24 * 365))
+    Order.objects.bulk_update(data.orders, ["order_date"], batch_size=1000)
+
+    for order, items in zip(data.orders, lines):
+        for item in items:
+            item.order = order
+    _insert(OrderItem, [item for items in lines for item in items])
+    _insert(Payment, [
+        Payment(user_id=order.user_id, order=order, amount=order.total, payment_method=rng.choice(PAYMENT_METHODS),
+                status="Completed")
+        for order in data.orders if order.status == "Delivered"
+    ])
+
+
+@transaction.atomic
+def seed(products=2000, users=20, orders_per_user=10, items_per_order=4, categories=8, subcategories=5,
+         random_seed=0):
+    """Build a catalog, an order history and its sales rollups; returns the created rows."""
+    rng = random.Random(random_seed)
+    data = Seeded()
+    seed_catalog(data, rng, categories=categories, subcategories=subcategories, products=products)
+    seed_history(data, rng, users=users, orders_per_user=orders_per_user, items_per_order=items_per_order)
+    analytics.rebuild()
+    return data
@@ -1,7 +1,14 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import Product, Category, Order, SubCategory, Address, Payment, CustomUser, OrderItem
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.db import transaction
+from django.db.models import Q
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from . import authentication, images, inventory
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -20,28 +27,83 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
+class DynamicFieldsMixin:
+    """
+    Lets API clients shape the payload through query params.
+
+    ``?fields=id,name,cost`` keeps only the listed fields and
+    ``?expand=subcategory,category`` keeps only the listed relations nested;
+    any other nested relation collapses to its primary key. Without the
+    params the serializer renders exactly as declared. The params only
+    shape reads: on writes they would drop submitted fields unnoticed.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request is not None and request.method in SAFE_METHODS:
+            if fields is None and 'fields' in request.query_params:
+                fields = _split_param(request.query_params['fields'])
+            if expand is None and 'expand' in request.query_params:
+                expand = _split_param(request.query_params['expand'])
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+        if expand is not None:
+            for name, field in list(self.fields.items()):
+                if not isinstance(field, serializers.BaseSerializer):
+                    continue
+                if name in expand and isinstance(field, DynamicFieldsMixin):
+                    self.fields[name] = field.__class__(read_only=True, expand=expand)
+                elif name not in expand:
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+
+def _split_param(value):
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+class ImageSrcsetField(serializers.ReadOnlyField):
+    """Resized variants of ``image`` as ``{"webp": {"320": url, ...}, "jpeg": {...}}``."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image_variants')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return images.variant_urls(value, request.build_absolute_uri if request else None)
+
+
 class CategorySerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField()
+
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ['image_variants']
 
 
-class SubCategorySerializer(serializers.ModelSerializer):
+class SubCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = SubCategory
-        fields = ['id', 'name', 'description', 'image', 'category']
+        fields = ['id', 'name', 'description', 'image', 'image_srcset', 'category']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     subcategory = SubCategorySerializer(read_only=True)
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'description', 'cost', 'discount', 'image',
-            'created_at', 'subcategory', 'weight', 'weight_unit', 'created_by'
+            'id', 'sku', 'name', 'description', 'cost', 'discount', 'image', 'image_srcset',
+            'created_at', 'subcategory', 'weight', 'weight_unit', 'stock', 'created_by'
         ]
 
 
@@ -67,62 +129,90 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = ['id', 'order', 'amount', 'payment_method', 'status', 'payment_date']
 
+    def validate(self, attrs):
+        order = attrs.get('order')
+        if order is not None and attrs.get('amount') != order.total:
+            raise serializers.ValidationError({'amount': f'Amount must equal the order total ({order.total}).'})
+        return attrs
+
 
 class UserSerializer(serializers.ModelSerializer):
-    addresses = AddressSerializer(many=True, read_only=True)  # fixed name
-    payments = PaymentSerializer(many=True, read_only=True, source='payment_set')  # fixed
-    orders = serializers.PrimaryKeyRelatedField(many=True, read_only=True, source='order_set')  # fixed
+    """
+    Profile with a bounded size: counts plus the most recent few addresses,
+    payments and order ids. ``UserProfileView`` attaches the ``recent_*`` lists
+    and ``*_count`` values; the full lists are paginated under ``/profile/``.
+    """
+    addresses = AddressSerializer(many=True, read_only=True, source='recent_addresses')
+    payments = PaymentSerializer(many=True, read_only=True, source='recent_payments')
+    orders = serializers.ListField(child=serializers.IntegerField(), read_only=True, source='recent_order_ids')
+    address_count = serializers.IntegerField(read_only=True)
+    payment_count = serializers.IntegerField(read_only=True)
+    order_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'raqam', 'addresses', 'payments', 'orders']
+        fields = [
+            'id', 'username', 'raqam', 'addresses', 'payments', 'orders',
+            'address_count', 'payment_count', 'order_count',
+        ]
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Log in with username or phone (``raqam``).
+
+    The user is looked up with one query and the password is hashed exactly
+    once; one refresh token is minted and kept on ``self.refresh`` for the
+    view to put in the cookie, while only the access token is returned.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        return authentication.token_for(user)
+
     def validate(self, attrs):
         login_field = attrs.get("username")  # correctly use username_field
         password = attrs.get("password")
 
-        # Try authenticate with username
-        user = authenticate(username=login_field, password=password)
-
-        if not user:
-            # Try phone
-            try:
-                user_obj = get_user_model().objects.get(raqam=login_field)
-            except get_user_model().DoesNotExist:
-                raise serializers.ValidationError("No user found with this username or phone")
-
-            user = authenticate(username=user_obj.username, password=password)
+        User = get_user_model()
+        # a username match wins over a phone match if both exist
+        candidates = sorted(
+            User.objects.filter(Q(username=login_field) | Q(raqam=login_field))[:2],
+            key=lambda candidate: candidate.username != login_field,
+        )
+        if not candidates:
+            # hash anyway so a missing account takes as long as a wrong password
+            User().set_password(password)
+            raise serializers.ValidationError("No user found with this username or phone")
 
-        if not user:
+        user = candidates[0]
+        if not user.check_password(password) or not api_settings.USER_AUTHENTICATION_RULE(user):
             raise serializers.ValidationError("Invalid credentials")
 
-        # Generate tokens
-        data = super().validate({"username": user.username, "password": password})
-
-        # Add extra user info
-        data["user"] = {
-            "id": user.id,
-            "name": user.get_full_name() or user.username,
-            "email": user.email,
-            "phone": getattr(user, "raqam", None),
+        self.user = user
+        self.refresh = self.get_token(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+
+        return {
+            "access": str(self.refresh.access_token),
+            # Add extra user info
+            "user": {
+                "id": user.id,
+                "name": user.get_full_name() or user.username,
+                "email": user.email,
+                "phone": getattr(user, "raqam", None),
+            },
         }
 
-        # add access token only not refresh token
-        data["access"] = str(self.get_token(user))
-        # Remove refresh token
-        data.pop("refresh", None)
-        return data
-
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(), source="product", write_only=True
-    )
+    # resolved to Product instances in bulk by OrderSerializer.validate_items
+    product_id = serializers.IntegerField(write_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ["id", "product", "product_id", "quantity"]
+        fields = ["id", "product", "product_id", "quantity", "unit_price", "discount"]
+        read_only_fields = ["unit_price", "discount"]
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -132,13 +222,33 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = ["id", "user", "items", "order_date", "status", "delivery_address"]
-        read_only_fields = ["user", "order_date"]
+        fields = [
+            "id", "user", "items", "order_date", "status", "delivery_address",
+            "item_count", "subtotal", "discount_total", "total",
+        ]
+        # status changes go through OrderViewSet.cancel / inventory.release, which return reserved stock
+        read_only_fields = ["user", "order_date", "status", "item_count", "subtotal", "discount_total", "total"]
+
+    def validate_items(self, items):
+        """Resolve every product_id with a single IN query."""
+        ids = {item["product_id"] for item in items}
+        products = Product.objects.select_related("subcategory__category").in_bulk(ids)
+
+        errors = [
+            {"product_id": [f'Invalid pk "{item["product_id"]}" - object does not exist.']}
+            if item["product_id"] not in products else {}
+            for item in items
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
 
+        for item in items:
+            item["product"] = products[item.pop("product_id")]
+        return items
+
+    @transaction.atomic
     def create(self, validated_data):
-        print("Validated data:", validated_data)
         items_data = validated_data.pop("items")
-        print("Items data:", items_data)
 
         delivery_address_data = validated_data.pop("delivery_address", None)
         address = None
@@ -158,7 +268,41 @@ class OrderSerializer(serializers.ModelSerializer):
             )
         validated_data['delivery_address'] = address
 
-        order = Order.objects.create(**validated_data)
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        # before any row referencing the products is inserted: the item inserts take shared
+        # FK locks on the product rows, which would deadlock with this UPDATE's exclusive locks
+        inventory.reserve([(item["product"].pk, item["quantity"]) for item in items_data])
+        items = [OrderItem(**item_data) for item_data in items_data]
+        for item in items:
+            item.snapshot_price()
+        order = Order(stock_reserved=True, reserved_until=inventory.reservation_deadline(), **validated_data)
+        order.set_totals(items)
+        order.save()
+        for item in items:
+            item.order = order
+        items = OrderItem.objects.bulk_create(items)
+        if any(item.pk is None for item in items):
+            # backends without INSERT ... RETURNING (MySQL): read the ids back in one query
+            products = {item.product_id: item.product for item in items}
+            items = list(order.items.order_by("id"))
+            for item in items:
+                item.product = products[item.product_id]
+        # serve order.items.all() from memory when the response is rendered
+        order._prefetched_objects_cache = {"items": items}
         return order
+
+
+class OrderListItemSerializer(OrderItemSerializer):
+    # order history lists only need the product itself, not its category chain
+    product = ProductSerializer(read_only=True, expand=())
+
+
+class OrderListSerializer(OrderSerializer):
+    items = OrderListItemSerializer(many=True, read_only=True)
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """One line per order, read straight from the denormalized order row."""
+
+    class Meta:
+        model = Order
+        fields = ["id", "order_date", "status", "item_count", "total"]
@@ -0,0 +1,122 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import analytics, authentication, category_tree, images, response_cache, search
+from .models import Category, CustomUser, Order, Product, SubCategory
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance])
+
+
+@receiver(post_save, sender=SubCategory)
+def reindex_subcategory_products(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.reindex_queryset(Product.objects.filter(subcategory=instance))
+
+
+@receiver(post_save, sender=SubCategory)
+def move_subcategory_products(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    # keep the denormalized Product.category in step with a moved subcategory
+    moved = Product.objects.filter(subcategory=instance).exclude(category_id=instance.category_id)
+    previous = set(moved.values_list("category_id", flat=True).distinct())
+    if not previous:
+        return
+    moved.update(category_id=instance.category_id)
+    # QuerySet.update sends no post_save: the lists of both categories change membership
+    response_cache.invalidate(
+        *(f"products:category:{category_id}" for category_id in previous | {instance.category_id}),
+    )
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.reindex_queryset(Product.objects.filter(subcategory__category=instance))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_category_tree(sender, **kwargs):
+    transaction.on_commit(category_tree.invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Product)
+def schedule_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not images.needs_variants(instance):
+        return
+    images.schedule(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_cached_user(sender, instance, **kwargs):
+    # Drop now and again after commit, so a request racing the transaction
+    # cannot re-cache the old password hash / active flag.
+    authentication.forget(instance.pk)
+    transaction.on_commit(lambda: authentication.forget(instance.pk))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    # A product moved to another category leaves the old category's lists too.
+    instance._previous_category_id = Product.objects.filter(pk=instance.pk).values_list("category_id", flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    response_cache.invalidate(
+        f"product:{instance.pk}",
+        "products",
+        f"products:category:{instance.category_id}",
+        f"products:category:{instance._previous_category_id}" if getattr(instance, "_previous_category_id", None) else None,
+    )
+
+
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def invalidate_subcategory_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Renames change search matches as well as the nested representation.
+    response_cache.invalidate(f"subcategory:{instance.pk}", "products", f"products:category:{instance.category_id}")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_responses(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    response_cache.invalidate(f"category:{instance.pk}", "products", f"products:category:{instance.pk}")
+
+
+@receiver(post_save, sender=Order)
+def sync_sales_rollups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # after commit: a new order's items are only inserted after the order row
+    transaction.on_commit(lambda: analytics.sync(instance.pk), robust=True)
+
+
+@receiver(pre_delete, sender=Order)
+def forget_sales(sender, instance, **kwargs):
+    analytics.forget(instance)
@@ -1,5 +1,42 @@
-from django.test import TestCase
+import csv
+import subprocess
+import sys
+import tempfile
+import threading
+import json
+import os
+import time
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models.signals import post_save
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import analytics, authentication, category_tree, idempotency, inventory, order_export, query_plans, response_cache, revocation, seed
+from .models import (
+    Category, SubCategory, Product, Order, OrderItem, Address, Payment,
+    CategoryDailySales, DailySales, ProductDailySales, SubCategoryDailySales,
+)
+from .serializers import PaymentSerializer, UserSerializer
+from .views import CategoryViewSet, OrderViewSet, ProductViewSet, load_profile
 
 User = get_user_model()
 
@@ -13,3 +50,1541 @@ class CustomUserTest(TestCase):
     def test_raqam_field(self):
         # raqam should default to username
         self.assertEqual(self.user.raqam, "testuser12345678")
+
+
+class ProductListTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Ichimliklar", description="Drinks", image="category_images/c.jpg")
+        subcategory = SubCategory.objects.create(category=category, name="Sharbatlar")
+        for i in range(5):
+            Product.objects.create(
+                subcategory=subcategory, name=f"Sharbat {i}", description="1L",
+                cost="12000.00", image="product_images/p.jpg",
+            )
+        self.category = category
+        self.subcategory = subcategory
+
+    def test_list_is_eager_loaded(self):
+        # page count and one joined select; the ETag comes from the page's rows
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/products/")
+        self.assertEqual(response.status_code, 200)
+        first = response.json()["results"][0]
+        self.assertEqual(first["subcategory"]["category"]["name"], "Ichimliklar")
+
+    def test_sparse_fields_and_flat_relations(self):
+        response = self.client.get("/api/products/?fields=id,name,subcategory&expand=")
+        first = response.json()["results"][0]
+        self.assertEqual(set(first), {"id", "name", "subcategory"})
+        self.assertEqual(first["subcategory"], self.subcategory.id)
+
+    def test_fields_param_does_not_drop_writes(self):
+        owner = User.objects.create_user(username="sotuvchi", password="secret")
+        product = Product.objects.filter(name="Sharbat 0").get()
+        Product.objects.filter(pk=product.pk).update(created_by=owner)
+        api = APIClient()
+        api.force_authenticate(owner)
+        response = api.patch(f"/api/products/{product.id}/?fields=id&expand=", {"name": "Nok sharbati"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "Nok sharbati")
+        product.refresh_from_db()
+        self.assertEqual(product.name, "Nok sharbati")
+
+    def test_expand_subcategory_only(self):
+        response = self.client.get("/api/products/?expand=subcategory")
+        subcategory = response.json()["results"][0]["subcategory"]
+        self.assertEqual(subcategory["name"], "Sharbatlar")
+        self.assertEqual(subcategory["category"], self.category.id)
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Sut mahsulotlari", image="category_images/c.jpg")
+        self.subcategory = SubCategory.objects.create(category=category, name="Qatiq")
+        self.yogurt = Product.objects.create(
+            subcategory=self.subcategory, name="Qatiq O‘zbegim", description="Tabiiy sut",
+            cost="9000.00", image="product_images/p.jpg",
+        )
+        self.milk = Product.objects.create(
+            subcategory=self.subcategory, name="Sut", description="Qatiq uchun sut",
+            cost="11000.00", image="product_images/p.jpg",
+        )
+
+    def search(self, query):
+        response = self.client.get("/api/products/", {"search": query})
+        return [product["id"] for product in response.json()["results"]]
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search("qatiq"), [self.yogurt.id, self.milk.id])
+
+    def test_cyrillic_and_apostrophe_variants(self):
+        self.assertEqual(self.search("ўзбег"), [self.yogurt.id])
+        self.assertEqual(self.search("o'zbegim"), [self.yogurt.id])
+
+    def test_all_tokens_must_match(self):
+        self.assertEqual(self.search("sut uchun"), [self.milk.id])
+
+    def test_index_follows_saves_and_renames(self):
+        self.milk.name = "Kefir"
+        self.milk.save()
+        self.assertEqual(self.search("kefir"), [self.milk.id])
+        self.subcategory.name = "Yogurt"
+        self.subcategory.save()
+        self.assertEqual(set(self.search("yogurt")), {self.yogurt.id, self.milk.id})
+        self.milk.delete()
+        self.assertEqual(self.search("kefir"), [])
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Mevalar", image="category_images/c.jpg")
+        subcategory = SubCategory.objects.create(category=category, name="Olma")
+        self.products = [
+            Product.objects.create(
+                subcategory=subcategory, name=f"Olma {i}", description="",
+                cost="5000.00", image="product_images/p.jpg",
+            )
+            for i in range(7)
+        ]
+        # force ties on created_at so the id tiebreaker is exercised
+        Product.objects.update(created_at=self.products[0].created_at)
+
+    def test_walks_feed_without_count_query(self):
+        expected = [product.id for product in reversed(self.products)]
+        seen = []
+        url = "/api/products/?pagination=cursor&page_size=3"
+        while url:
+            with self.assertNumQueries(1):  # the page; its ETag is computed from the rows
+                body = self.client.get(url).json()
+            self.assertNotIn("count", body)
+            seen.extend(product["id"] for product in body["results"])
+            url = body["next"]
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get("/api/products/?pagination=cursor&page_size=3").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_client_selected_page_size(self):
+        response = self.client.get("/api/products/?page_size=2")
+        self.assertEqual(len(response.json()["results"]), 2)
+        response = self.client.get("/api/products/?page_size=1000")
+        self.assertEqual(len(response.json()["results"]), 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/products/?cursor=bogus")
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_invalid_values(self):
+        for position in (["2026-10-18T09:53:45+00:00", "abc"], ["not a date", 1], [{"x": 1}, 1]):
+            with self.subTest(position=position):
+                cursor = urlsafe_b64encode(json.dumps({"p": position}).encode()).decode()
+                self.assertEqual(self.client.get(f"/api/products/?cursor={cursor}").status_code, 404)
+
+
+class CategoryTreeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Non", image="category_images/c.jpg")
+        self.subcategory = SubCategory.objects.create(category=self.category, name="Patir")
+        Product.objects.create(
+            subcategory=self.subcategory, name="Patir non", description="",
+            cost="4000.00", image="product_images/p.jpg",
+        )
+
+    def test_tree_is_served_from_cache(self):
+        first = self.client.get("/api/categories/tree/")
+        tree = first.json()["categories"]
+        self.assertEqual(tree[0]["product_count"], 1)
+        self.assertEqual(tree[0]["subcategories"][0]["name"], "Patir")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/categories/tree/")
+        self.assertEqual(second.content, first.content)
+
+    def test_write_during_rebuild_is_not_cached(self):
+        build = category_tree.build
+
+        def racing_build():
+            tree = build()  # read before the write below commits
+            SubCategory.objects.create(category=self.category, name="Lochira")
+            category_tree.invalidate()
+            return tree
+
+        with mock.patch.object(category_tree, "build", side_effect=racing_build):
+            stale = category_tree.get()
+        self.assertEqual(len(json.loads(stale[1])["categories"][0]["subcategories"]), 1)
+        fresh = json.loads(self.client.get("/api/categories/tree/").content)
+        self.assertEqual(len(fresh["categories"][0]["subcategories"]), 2)
+
+    def test_process_local_cache_keeps_trees_briefly(self):
+        self.assertEqual(category_tree.tree_timeout(), category_tree.LOCAL_TREE_TIMEOUT)
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(category_tree.tree_timeout(), category_tree.TREE_TIMEOUT)
+
+    def test_not_modified(self):
+        etag = self.client.get("/api/categories/tree/")["ETag"]
+        response = self.client.get("/api/categories/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_rebuilt_after_change(self):
+        etag = self.client.get("/api/categories/tree/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            SubCategory.objects.create(category=self.category, name="Lochira")
+        response = self.client.get("/api/categories/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["categories"][0]["subcategories"]), 2)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Go'sht", image="category_images/c.jpg")
+        self.subcategory = SubCategory.objects.create(category=category, name="Mol go'shti")
+        self.product = Product.objects.create(
+            subcategory=self.subcategory, name="Lahm", description="",
+            cost="95000.00", image="product_images/p.jpg",
+        )
+
+    def test_list_not_modified_until_change(self):
+        etag = self.client.get("/api/products/")["ETag"]
+        with self.assertNumQueries(2):  # count + page, nothing serialized
+            response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.subcategory.save()
+        response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_etag_comes_from_the_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            etag = self.client.get("/api/products/?pagination=cursor")["ETag"]
+        self.assertFalse([q["sql"] for q in queries.captured_queries if "MAX(" in q["sql"]])
+        inventory.reserve([(self.product.id, 1)])  # moves updated_at, as checkout does
+        response = self.client.get("/api/products/?pagination=cursor", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.product.delete()
+        response = self.client.get("/api/products/?pagination=cursor", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.json()["results"]), (200, []))
+
+    def test_list_etag_varies_with_query(self):
+        self.assertNotEqual(
+            self.client.get("/api/products/")["ETag"],
+            self.client.get("/api/products/?fields=id")["ETag"],
+        )
+
+    def test_detail_if_modified_since(self):
+        url = f"/api/products/{self.product.id}/"
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_detail_is_404(self):
+        self.assertEqual(self.client.get("/api/products/0/").status_code, 404)
+
+    def test_category_list_etag(self):
+        etag = self.client.get("/api/categories/")["ETag"]
+        response = self.client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+def make_jpeg(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "orange").save(buffer, "JPEG")
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(IMAGE_VARIANTS_ASYNC=False, IMAGE_VARIANT_WIDTHS=(160, 320))
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        category = Category.objects.create(name="Sabzavot", image="category_images/c.jpg")
+        self.subcategory = SubCategory.objects.create(category=category, name="Pomidor")
+
+    def create_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                subcategory=self.subcategory, name="Pomidor", description="",
+                cost="15000.00", image=make_jpeg(800, 600),
+            )
+
+    def test_variants_generated_after_upload(self):
+        product = self.create_product()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants["source"], product.image.name)
+        self.assertEqual(set(product.image_variants["webp"]), {"160", "320"})
+        with default_storage.open(product.image_variants["webp"]["320"]) as variant:
+            self.assertEqual(Image.open(variant).size, (320, 240))
+
+    def test_serializer_exposes_srcset(self):
+        product = self.create_product()
+        body = self.client.get(f"/api/products/{product.id}/").json()
+        self.assertTrue(body["image_srcset"]["jpeg"]["160"].startswith("http://testserver/media/product_images/variants/"))
+
+
+class MediaDeliveryTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        default_storage.save("product_images/variants/a.1f2e3d4c.320w.jpg", SimpleUploadedFile("a", b"0123456789"))
+
+    def test_streams_with_immutable_cache_headers(self):
+        response = self.client.get("/media/product_images/variants/a.1f2e3d4c.320w.jpg")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_range_request(self):
+        url = "/media/product_images/variants/a.1f2e3d4c.320w.jpg"
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        response = self.client.get(url, HTTP_RANGE="bytes=20-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */10"))
+        self.assertFalse(response.has_header("ETag") or response.has_header("Cache-Control"))
+
+    @override_settings(MEDIA_DELIVERY="x-accel-redirect")
+    def test_offloads_to_proxy(self):
+        response = self.client.get("/media/product_images/variants/a.1f2e3d4c.320w.jpg")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/product_images/variants/a.1f2e3d4c.320w.jpg")
+        self.assertEqual(response.content, b"")
+
+    @override_settings(MEDIA_DELIVERY="x-accel-redirect")
+    def test_offloads_non_ascii_names_percent_encoded(self):
+        default_storage.save("product_images/Шоколад плитка.jpg", SimpleUploadedFile("b", b"0123"))
+        response = self.client.get("/media/product_images/Шоколад плитка.jpg")
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            "/protected-media/product_images/%D0%A8%D0%BE%D0%BA%D0%BE%D0%BB%D0%B0%D0%B4%20%D0%BF%D0%BB%D0%B8%D1%82%D0%BA%D0%B0.jpg",
+        )
+
+    def test_rejects_traversal(self):
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+
+
+class OrderCreateTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="xaridor", password="secret")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        category = Category.objects.create(name="Bakaleya", image="category_images/c.jpg")
+        subcategory = SubCategory.objects.create(category=category, name="Guruch")
+        self.products = [
+            Product.objects.create(
+                subcategory=subcategory, name=f"Guruch {i}", description="",
+                cost="20000.00", image="product_images/p.jpg",
+            )
+            for i in range(40)
+        ]
+
+    def payload(self, products):
+        return {
+            "items": [{"product_id": product.id, "quantity": 2} for product in products],
+            "delivery_address": {"street": "Navoiy 1", "district": "Yunusobod", "city": "Toshkent"},
+        }
+
+    def test_query_count_does_not_grow_with_basket(self):
+        self.api.post("/api/orders/", self.payload(self.products[:1]), format="json")  # saves the address
+        # products IN query, address lookup, order insert, bulk item insert,
+        # one stock reservation UPDATE (+ savepoints)
+        with self.assertNumQueries(9):
+            self.api.post("/api/orders/", self.payload(self.products[:2]), format="json")
+        with self.assertNumQueries(9):
+            response = self.api.post("/api/orders/", self.payload(self.products), format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["items"]), 40)
+        self.assertTrue(all(item["id"] for item in response.json()["items"]))
+
+    def test_unknown_product_rejects_whole_order(self):
+        payload = self.payload(self.products[:1])
+        payload["items"].append({"product_id": 0, "quantity": 1})
+        response = self.api.post("/api/orders/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("product_id", response.json()["items"][1])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class OrderHistoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="doimiy", password="secret")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        category = Category.objects.create(name="Shirinliklar", image="category_images/c.jpg")
+        subcategory = SubCategory.objects.create(category=category, name="Pechenye")
+        products = [
+            Product.objects.create(
+                subcategory=subcategory, name=f"Pechenye {i}", description="",
+                cost="10000.00", discount="10.00", image="product_images/p.jpg",
+            )
+            for i in range(3)
+        ]
+        for _ in range(5):
+            self.api.post("/api/orders/", {
+                "items": [{"product_id": product.id, "quantity": 2} for product in products],
+                "delivery_address": {"street": "Amir Temur 5", "district": "Mirobod", "city": "Toshkent"},
+            }, format="json")
+        self.order = Order.objects.filter(user=self.user).first()
+
+    def test_list_is_prefetched(self):
+        # count, orders + address, items + products
+        with self.assertNumQueries(3):
+            response = self.api.get("/api/orders/")
+        item = response.json()["results"][0]["items"][0]
+        self.assertEqual(item["product"]["subcategory"], self.order.items.first().product.subcategory_id)
+
+    def test_summary(self):
+        with self.assertNumQueries(2):  # count + one query on the order table alone
+            response = self.api.get("/api/orders/?view=summary")
+        summary = response.json()["results"][0]
+        self.assertEqual(set(summary), {"id", "order_date", "status", "item_count", "total"})
+        self.assertEqual(summary["item_count"], 3)
+        self.assertEqual(summary["total"], "54000.00")
+
+    def test_totals_are_snapshotted(self):
+        Product.objects.update(cost="99999.00", discount="0.00")
+        response = self.api.get(f"/api/orders/{self.order.id}/").json()
+        self.assertEqual(response["items"][0]["unit_price"], "10000.00")
+        self.assertEqual(response["items"][0]["discount"], "10.00")
+        self.assertEqual((response["subtotal"], response["discount_total"], response["total"]),
+                         ("60000.00", "6000.00", "54000.00"))
+
+    def test_payment_amount_checked_against_order_total(self):
+        payment = {"order": self.order.id, "payment_method": "Naqd"}
+        self.assertTrue(PaymentSerializer(data={**payment, "amount": "54000.00"}).is_valid())
+        self.assertFalse(PaymentSerializer(data={**payment, "amount": "50000.00"}).is_valid())
+
+    def test_retrieve_has_full_detail(self):
+        with self.assertNumQueries(2):
+            response = self.api.get(f"/api/orders/{self.order.id}/")
+        self.assertEqual(response.json()["items"][0]["product"]["subcategory"]["category"]["name"], "Shirinliklar")
+
+
+class IdempotencyKeyTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="qaytaruvchi", password="secret")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        category = Category.objects.create(name="Choy", image="category_images/c.jpg")
+        subcategory = SubCategory.objects.create(category=category, name="Ko'k choy")
+        self.product = Product.objects.create(
+            subcategory=subcategory, name="Ko'k choy 95", description="",
+            cost="18000.00", image="product_images/p.jpg",
+        )
+
+    def submit(self, key, quantity=1):
+        return self.api.post("/api/orders/", {
+            "items": [{"product_id": self.product.id, "quantity": quantity}],
+            "delivery_address": {"street": "Bobur 3", "district": "Chilonzor", "city": "Toshkent"},
+        }, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_original_order(self):
+        first = self.submit("basket-1")
+        retry = self.submit("basket-1")
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json()["id"], first.json()["id"])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_replay_returns_the_first_response(self):
+        first = self.submit("basket-5")
+        self.api.post(f"/api/orders/{first.json()['id']}/cancel/")
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.submit("basket-5")
+        self.assertFalse([q["sql"] for q in queries if "backendapi_order" in q["sql"]])  # nothing reloaded
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.json()["status"], "Pending")
+
+    def test_key_reused_with_other_payload(self):
+        self.submit("basket-2")
+        self.assertEqual(self.submit("basket-2", quantity=5).status_code, 422)
+
+    def test_in_flight_duplicate_conflicts(self):
+        payload = {
+            "items": [{"product_id": self.product.id, "quantity": 1}],
+            "delivery_address": {"street": "Bobur 3", "district": "Chilonzor", "city": "Toshkent"},
+        }
+        idempotency.claim(self.user, "basket-3", payload)
+        self.assertEqual(self.submit("basket-3").status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failed_validation_releases_key(self):
+        response = self.api.post("/api/orders/", {"items": [{"product_id": 0, "quantity": 1}]},
+                                 format="json", HTTP_IDEMPOTENCY_KEY="basket-4")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.submit("basket-4").status_code, 201)
+
+
+class InventoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="aksiya", password="secret")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        category = Category.objects.create(name="Yog'", image="category_images/c.jpg")
+        subcategory = SubCategory.objects.create(category=category, name="Paxta yog'i")
+        self.oil = Product.objects.create(
+            subcategory=subcategory, name="Paxta yog'i 1L", description="",
+            cost="25000.00", stock=5, image="product_images/p.jpg",
+        )
+        self.salt = Product.objects.create(
+            subcategory=subcategory, name="Tuz", description="",
+            cost="2000.00", image="product_images/p.jpg",
+        )
+
+    def order(self, *lines):
+        return self.api.post("/api/orders/", {
+            "items": [{"product_id": product.id, "quantity": quantity} for product, quantity in lines],
+            "delivery_address": {"street": "Mustaqillik 2", "district": "Yakkasaroy", "city": "Toshkent"},
+        }, format="json")
+
+    def test_reserves_tracked_stock_only(self):
+        self.assertEqual(self.order((self.oil, 2), (self.salt, 10), (self.oil, 1)).status_code, 201)
+        self.oil.refresh_from_db()
+        self.salt.refresh_from_db()
+        self.assertEqual(self.oil.stock, 2)
+        self.assertIsNone(self.salt.stock)
+
+    def test_shortage_rejects_order(self):
+        response = self.order((self.salt, 1), (self.oil, 6))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["items"][1]["quantity"], ["Only 5 left in stock."])
+        self.oil.refresh_from_db()
+        self.assertEqual(self.oil.stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_stock_is_never_oversold(self):
+        # runs everywhere; ConcurrentCheckoutTest adds real concurrency on MySQL
+        results = [self.order((self.oil, 2)).status_code for _ in range(4)]
+        self.assertEqual(results, [201, 201, 400, 400])
+        with self.assertRaises(ValidationError):
+            inventory.reserve([(self.salt.id, 3), (self.oil.id, 2)])
+        inventory.reserve([(self.oil.id, 1)])
+        with self.assertRaises(ValidationError):
+            inventory.reserve([(self.oil.id, 1)])
+        self.oil.refresh_from_db()
+        self.assertEqual(self.oil.stock, 0)
+        self.assertEqual(sum(OrderItem.objects.filter(product=self.oil).values_list("quantity", flat=True)), 4)
+
+    def test_cancel_returns_stock_once(self):
+        order_id = self.order((self.oil, 4)).json()["id"]
+        self.assertEqual(self.api.post(f"/api/orders/{order_id}/cancel/").json()["status"], "Cancelled")
+        self.assertEqual(self.api.post(f"/api/orders/{order_id}/cancel/").status_code, 400)
+        self.oil.refresh_from_db()
+        self.assertEqual(self.oil.stock, 5)
+
+    def test_status_is_not_writable(self):
+        order_id = self.order((self.oil, 3)).json()["id"]
+        response = self.api.patch(f"/api/orders/{order_id}/", {"status": "Cancelled"}, format="json")
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.api.delete(f"/api/orders/{order_id}/").status_code, 405)
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual((order.status, order.stock_reserved), ("Pending", True))
+        self.assertEqual(self.api.post(f"/api/orders/{order_id}/cancel/").status_code, 200)
+        self.oil.refresh_from_db()
+        self.assertEqual(self.oil.stock, 5)
+
+    def test_submitted_status_is_ignored(self):
+        response = self.api.post("/api/orders/", {
+            "items": [{"product_id": self.oil.id, "quantity": 1}], "status": "Cancelled",
+            "delivery_address": {"street": "Mustaqillik 2", "district": "Yakkasaroy", "city": "Toshkent"},
+        }, format="json")
+        self.assertEqual(response.json()["status"], "Pending")
+        self.oil.refresh_from_db()
+        self.assertEqual(self.oil.stock, 4)
+
+    def test_expired_reservations_are_released(self):
+        order_id = self.order((self.oil, 3)).json()["id"]
+        Order.objects.filter(pk=order_id).update(reserved_until=self.oil.created_at)
+        self.assertEqual(inventory.release_expired(), 1)
+        self.oil.refresh_from_db()
+        self.assertEqual(self.oil.stock, 5)
+        self.assertEqual(Order.objects.get(pk=order_id).status, "Expired")
+
+    def test_late_release_leaves_finished_order_alone(self):
+        order_id = self.order((self.oil, 2)).json()["id"]
+        Order.objects.filter(pk=order_id).update(status="Delivered")
+        self.assertFalse(inventory.release(Order(pk=order_id), status=inventory.EXPIRED))
+        Order.objects.filter(pk=order_id).update(stock_reserved=False)
+        self.assertFalse(inventory.release(Order(pk=order_id)))
+        self.oil.refresh_from_db()
+        self.assertEqual((Order.objects.get(pk=order_id).status, self.oil.stock), ("Delivered", 3))
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite locks the whole database; run against MySQL")
+class ConcurrentCheckoutTest(TransactionTestCase):
+    shoppers = 30
+    stock = 7
+
+    def setUp(self):
+        category = Category.objects.create(name="Aksiya", image="category_images/c.jpg")
+        subcategory = SubCategory.objects.create(category=category, name="Shakar")
+        self.sugar = Product.objects.create(
+            subcategory=subcategory, name="Shakar 1kg", description="",
+            cost="14000.00", stock=self.stock, image="product_images/p.jpg",
+        )
+        self.users = [User.objects.create_user(username=f"shopper{i}") for i in range(self.shoppers)]
+
+    def checkout(self, user, results):
+        api = APIClient()
+        api.force_authenticate(user)
+        try:
+            # no retries: a deadlock (MySQL 1213) fails the test
+            response = api.post("/api/orders/", {
+                "items": [{"product_id": self.sugar.id, "quantity": 1}],
+                "delivery_address": {"street": "Chorsu", "district": "Shayxontohur", "city": "Toshkent"},
+            }, format="json")
+            results.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_hot_sku_is_never_oversold(self):
+        results = []
+        threads = [threading.Thread(target=self.checkout, args=(user, results)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.sugar.refresh_from_db()
+        self.assertEqual(len(results), self.shoppers)
+        self.assertEqual(results.count(201), self.stock)
+        self.assertEqual(self.sugar.stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=self.sugar).count(), self.stock)
+
+
+class UserProfileTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="eski_mijoz", password="secret")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        for i in range(12):
+            address = Address.objects.create(user=self.user, street=f"Ko'cha {i}", district="Olmazor",
+                                             city="Toshkent", postal_code="100000")
+            order = Order.objects.create(user=self.user, delivery_address=address, total="1000.00")
+            Payment.objects.create(user=self.user, order=order, amount="1000.00", payment_method="Karta")
+
+    def test_profile_is_bounded(self):
+        with self.assertNumQueries(4):
+            body = self.api.get("/api/profile/").json()
+        self.assertEqual((body["address_count"], body["payment_count"], body["order_count"]), (12, 12, 12))
+        self.assertEqual(len(body["addresses"]), 5)
+        self.assertEqual(len(body["payments"]), 5)
+        self.assertEqual(body["orders"], list(Order.objects.order_by("-id").values_list("id", flat=True)[:5]))
+
+    def test_update_returns_profile(self):
+        body = self.api.put("/api/profile/", {"raqam": "+998901234567"}, format="json").json()
+        self.assertEqual(body["raqam"], "+998901234567")
+        self.assertEqual(body["order_count"], 12)
+
+    def test_sub_resources_are_paginated(self):
+        for url in ("/api/profile/addresses/", "/api/profile/payments/", "/api/profile/orders/"):
+            with self.assertNumQueries(2):
+                body = self.api.get(url, {"page_size": 10}).json()
+            self.assertEqual(body["count"], 12)
+            self.assertEqual(len(body["results"]), 10)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoginTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="kirish", raqam="+998971112233", password="secret-123")
+
+    def login(self, login, password="secret-123"):
+        with mock.patch.object(MD5PasswordHasher, "encode", autospec=True, side_effect=MD5PasswordHasher.encode) as encode:
+            response = self.client.post("/api/login/", {"username": login, "password": password},
+                                        content_type="application/json")
+        return response, encode.call_count
+
+    def test_username_and_phone_hash_once(self):
+        for login in ("kirish", "+998971112233"):
+            with self.assertNumQueries(1):
+                response, hashes = self.login(login)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(hashes, 1)
+            self.assertEqual(AccessToken(response.json()["access"])["user_id"], str(self.user.id))
+            self.assertEqual(RefreshToken(response.cookies["refresh_token"].value)["user_id"], str(self.user.id))
+
+    def test_wrong_password(self):
+        response, hashes = self.login("+998971112233", "wrong")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(hashes, 1)
+
+    def test_unknown_user_still_hashes(self):
+        response, hashes = self.login("nobody")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(hashes, 1)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class StatelessAuthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="stateless", email="s@example.com", password="secret-123")
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {authentication.token_for(self.user).access_token}")
+
+    def test_no_user_query_once_cached(self):
+        self.api.get("/api/profile/addresses/")
+        with self.assertNumQueries(1):  # the (empty) page count, no user row
+            response = self.api.get("/api/profile/addresses/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_lazy_user_loads_row_once(self):
+        token = authentication.token_for(self.user).access_token
+        user = authentication.StatelessJWTAuthentication().get_user(token)
+        self.assertEqual(user.username, "stateless")
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email, user.first_name, user.raqam), ("s@example.com", "", "stateless"))
+
+    def test_password_change_invalidates_token(self):
+        self.assertEqual(self.api.get("/api/profile/addresses/").status_code, 200)
+        self.user.set_password("another-456")
+        self.user.save()
+        self.assertEqual(self.api.get("/api/profile/addresses/").status_code, 401)
+
+    def test_deactivation_invalidates_token(self):
+        self.assertEqual(self.api.get("/api/profile/addresses/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.api.get("/api/profile/addresses/").status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class RefreshRotationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        revocation.revoked.reset()
+        self.user = User.objects.create_user(username="rotating", password="secret-123")
+        self.refresh = str(authentication.token_for(self.user))
+
+    def post(self, path, refresh=None, access=None):
+        api = APIClient()
+        if refresh:
+            api.cookies["refresh_token"] = refresh
+        if access:
+            api.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return api.post(path)
+
+    def test_refresh_rotates_and_old_token_is_rejected(self):
+        response = self.post("/api/token/refresh/", self.refresh)
+        self.assertEqual(response.status_code, 200)
+        rotated = response.cookies["refresh_token"].value
+        self.assertNotEqual(rotated, self.refresh)
+        self.assertEqual(self.post("/api/token/refresh/", self.refresh).status_code, 400)
+        self.assertEqual(self.post("/api/token/refresh/", rotated).status_code, 200)
+
+    def test_revocation_check_does_not_query(self):
+        self.post("/api/token/refresh/", str(authentication.token_for(self.user)))
+        with self.assertNumQueries(3):  # savepoint, INSERT of the rotated jti, release
+            self.assertEqual(self.post("/api/token/refresh/", self.refresh).status_code, 200)
+
+    def test_logout_revokes_cookie(self):
+        response = self.post("/api/logout/", self.refresh)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.cookies["refresh_token"].value, "")
+        self.assertEqual(self.post("/api/token/refresh/", self.refresh).status_code, 400)
+
+    def test_logout_all_invalidates_every_token(self):
+        other = authentication.token_for(self.user)
+        access = str(other.access_token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.post("/api/logout/all/", access=access).status_code, 204)
+        self.assertEqual(self.post("/api/token/refresh/", self.refresh).status_code, 400)
+        self.assertEqual(self.post("/api/token/refresh/", str(other)).status_code, 400)
+        self.assertEqual(self.post("/api/logout/all/", access=access).status_code, 401)
+        fresh = authentication.token_for(User.objects.get(pk=self.user.pk))
+        self.assertEqual(self.post("/api/token/refresh/", str(fresh)).status_code, 200)
+
+    def test_tokens_without_auth_version_are_rejected(self):
+        legacy = RefreshToken.for_user(self.user)
+        self.assertEqual(self.post("/api/token/refresh/", str(legacy)).status_code, 400)
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {legacy.access_token}")
+        self.assertEqual(api.get("/api/profile/").status_code, 401)
+        # simplejwt's stock views, which mint such tokens, are not routed
+        self.assertEqual(api.post("/api/token/", {"username": "rotating", "password": "secret-123"}).status_code, 404)
+
+    def test_bloom_filter(self):
+        bloom = revocation.BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        self.assertTrue(all(f"jti-{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(RESPONSE_CACHE_CLOCK_SKEW=0, RESPONSE_CACHE_LOCK_WAIT=0.1)
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        drinks = Category.objects.create(name="Ichimliklar", image="category_images/c.jpg")
+        bread = Category.objects.create(name="Non", image="category_images/c.jpg")
+        self.juices = SubCategory.objects.create(category=drinks, name="Sharbatlar")
+        self.loaves = SubCategory.objects.create(category=bread, name="Buxanka")
+        self.juice = Product.objects.create(
+            subcategory=self.juices, name="Olma sharbati", description="1L",
+            cost="12000.00", stock=3, image="product_images/p.jpg",
+        )
+        self.loaf = Product.objects.create(
+            subcategory=self.loaves, name="Buxanka", description="",
+            cost="4000.00", image="product_images/p.jpg",
+        )
+        self.bread_list = f"/api/products/?category_id={bread.id}&search="
+
+    def get(self, path):
+        time.sleep(0.01)  # keep tag and entry timestamps apart
+        return self.client.get(path)
+
+    def test_second_read_is_served_without_queries(self):
+        self.assertEqual(self.get(self.bread_list)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.get(f"/api/products/?search=&category_id={self.loaf.subcategory.category_id}")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.json()["results"][0]["name"], "Buxanka")
+        self.assertEqual(response_cache.stats(), {"hit": 1, "miss": 1, "wait": 0})
+
+    def test_hit_answers_conditional_request(self):
+        etag = self.get(f"/api/products/{self.juice.id}/")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/api/products/{self.juice.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_change_invalidates_only_its_responses(self):
+        self.get("/api/products/")
+        self.get(self.bread_list)
+        self.get(f"/api/products/{self.juice.id}/")
+        self.juice.name = "Nok sharbati"
+        self.juice.save()
+        self.assertEqual(self.get("/api/products/")["X-Cache"], "MISS")
+        self.assertEqual(self.get(self.bread_list)["X-Cache"], "HIT")
+        response = self.get(f"/api/products/{self.juice.id}/")
+        self.assertEqual((response["X-Cache"], response.json()["name"]), ("MISS", "Nok sharbati"))
+
+    def test_subcategory_rename_and_stock_reservation_invalidate(self):
+        self.get(f"/api/products/{self.juice.id}/")
+        self.juices.name = "Tabiiy sharbatlar"
+        self.juices.save()
+        response = self.get(f"/api/products/{self.juice.id}/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        inventory.reserve([(self.juice.id, 2)])
+        response = self.get(f"/api/products/{self.juice.id}/")
+        self.assertEqual((response["X-Cache"], response.json()["stock"]), ("MISS", 1))
+
+    def test_moved_subcategory_invalidates_both_category_lists(self):
+        drinks, bread = self.juices.category, self.loaves.category
+        water = SubCategory.objects.create(category=drinks, name="Suv")
+        Product.objects.create(subcategory=water, name="Suv 1L", description="", cost="3000.00",
+                               image="product_images/p.jpg")
+        drinks_list = f"/api/products/?category_id={drinks.id}&page_size=1"  # juice is not on the page
+        self.assertEqual(self.get(drinks_list).json()["count"], 2)
+        self.assertEqual(self.get(self.bread_list).json()["count"], 1)
+        self.juices.category = bread
+        self.juices.save()
+        self.assertEqual(self.get(drinks_list).json()["count"], 1)
+        self.assertEqual(self.get(self.bread_list).json()["count"], 2)
+
+    def test_authenticated_reads_bypass_cache(self):
+        api = APIClient()
+        api.force_authenticate(User.objects.create_user(username="keshsiz", password="secret"))
+        self.assertNotIn("X-Cache", api.get("/api/products/"))
+
+    def test_contended_miss_waits_then_computes(self):
+        # Another request holds the lock but gives up without storing anything.
+        with mock.patch.object(response_cache, "acquire", return_value=False):
+            response = self.get("/api/products/")
+        self.assertEqual((response.status_code, response["X-Cache"]), (200, "MISS"))
+        self.assertEqual(response_cache.stats(), {"hit": 0, "miss": 1, "wait": 1})
+
+
+class QueryPlanTest(TestCase):
+    """
+    EXPLAIN the queries behind the hot endpoints and fail on full table scans
+    or sorts that do not come from an index. Tables listed next to a path may
+    be scanned on purpose (tiny lookup tables).
+    """
+    CASES = [
+        ("/api/products/", set()),
+        ("/api/products/?pagination=cursor", set()),
+        ("/api/products/?ordering=cost", set()),
+        ("/api/products/?ordering=-cost&page=2", set()),
+        ("/api/products/?category_id={category}", set()),
+        ("/api/products/?category_id={category}&pagination=cursor", set()),
+        ("/api/products/{product}/", set()),
+        ("/api/orders/", set()),
+        ("/api/orders/?view=summary", set()),
+        ("/api/orders/{order}/", set()),
+        ("/api/profile/", set()),
+        ("/api/profile/addresses/", set()),
+        ("/api/profile/payments/", set()),
+        ("/api/profile/orders/?pagination=cursor", set()),
+        ("/api/categories/", {"backendapi_category"}),
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reja", password="secret")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        categories = [Category.objects.create(name=f"Bo'lim {i}", image="category_images/c.jpg") for i in range(4)]
+        subcategories = [
+            SubCategory.objects.create(category=category, name=f"{category.name}.{j}")
+            for category in categories for j in range(3)
+        ]
+        products = [
+            Product.objects.create(
+                subcategory=subcategories[i % len(subcategories)], name=f"Mahsulot {i}", description="",
+                cost=f"{1000 + i * 37 % 500}.00", image="product_images/p.jpg",
+            )
+            for i in range(60)
+        ]
+        for i in range(6):
+            response = self.api.post("/api/orders/", {
+                "items": [{"product_id": products[i].id, "quantity": 1}, {"product_id": products[i + 1].id, "quantity": 2}],
+                "delivery_address": {"street": f"Navoiy {i}", "district": "Shayxontohur", "city": "Toshkent"},
+            }, format="json")
+            order = Order.objects.get(pk=response.json()["id"])
+            Payment.objects.create(user=self.user, order=order, amount=order.total, payment_method="Naqd")
+        self.ids = {"category": categories[1].id, "product": products[5].id, "order": order.id}
+
+    def test_hot_paths_use_indexes(self):
+        for path, allow_scans in self.CASES:
+            path = path.format(**self.ids)
+            with self.subTest(path=path):
+                response, queries = query_plans.capture(self.api.get, path)
+                self.assertEqual(response.status_code, 200)
+                for sql in queries:
+                    self.assertEqual(query_plans.problems(sql, allow_scans), [], sql)
+
+    def test_checkout_lookups_use_indexes(self):
+        product = Product.objects.first()
+        _, queries = query_plans.capture(self.api.post, "/api/orders/", {
+            "items": [{"product_id": product.id, "quantity": 1}],
+            "delivery_address": {"street": "Navoiy 2", "district": "Shayxontohur", "city": "Toshkent"},
+        }, format="json")
+        for sql in queries:
+            self.assertEqual(query_plans.problems(sql), [], sql)
+
+    def test_fixture_loading_leaves_products_alone(self):
+        product = Product.objects.select_related("subcategory").first()
+        subcategory = product.subcategory
+        other = Category.objects.exclude(pk=subcategory.category_id).first()
+        subcategory.category = other
+        with CaptureQueriesContext(connection) as queries:
+            post_save.send(SubCategory, instance=subcategory, created=False, raw=True, using="default")
+        self.assertEqual(len(queries), 0)
+
+    def test_harness_flags_scan_and_sort(self):
+        _, queries = query_plans.capture(list, Product.objects.order_by("name"))
+        self.assertEqual(len(query_plans.problems(queries[0])), 2)
+
+
+# Time budgets are for a developer machine; slower CI runners or a remote
+# MySQL can scale them with PERF_BUDGET_FACTOR.
+PERF_BUDGET_FACTOR = float(os.environ.get("PERF_BUDGET_FACTOR", "1"))
+
+
+class PerformanceBudgetMixin:
+    """Seeded catalog/history plus helpers asserting query and time budgets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed.seed(products=2000, users=10, orders_per_user=60, items_per_order=4)
+        cls.user = cls.data.users[0]
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def measure(self, func, runs=3):
+        """Return ``(result of the first run, its query count, best time in ms)``."""
+        timings = []
+        for run in range(runs):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                result = func()
+                timings.append((time.perf_counter() - started) * 1000)
+            if run == 0:
+                first, query_count = result, len(queries)
+        return first, query_count, min(timings)
+
+    def assertWithinBudget(self, label, query_count, elapsed_ms, max_queries, max_ms):
+        self.assertLessEqual(query_count, max_queries, f"{label}: {query_count} queries")
+        self.assertLessEqual(elapsed_ms, max_ms * PERF_BUDGET_FACTOR, f"{label}: {elapsed_ms:.1f} ms")
+
+
+class EndpointBudgetTest(PerformanceBudgetMixin, TestCase):
+    # path, max queries, max milliseconds
+    READS = [
+        ("/api/products/", 3, 100),
+        ("/api/products/?page_size=100", 3, 250),
+        ("/api/products/?category_id={category}", 3, 100),
+        ("/api/products/?search=olma sut", 3, 300),
+        ("/api/products/?ordering=-cost", 3, 100),
+        ("/api/products/?pagination=cursor&page_size=50", 2, 150),
+        ("/api/products/{product}/", 2, 50),
+        ("/api/categories/", 2, 50),
+        ("/api/categories/{category}/", 2, 50),
+        ("/api/categories/tree/", 2, 100),
+        ("/api/orders/", 3, 100),
+        ("/api/orders/?page_size=50", 3, 300),
+        ("/api/orders/?view=summary&page_size=100", 2, 100),
+        ("/api/orders/{order}/", 2, 100),
+        ("/api/profile/", 4, 100),
+        ("/api/profile/addresses/", 2, 50),
+        ("/api/profile/payments/?page_size=50", 2, 100),
+        ("/api/profile/orders/?page_size=50", 2, 50),
+    ]
+
+    def test_read_endpoints(self):
+        ids = {
+            "category": self.data.categories[2].id,
+            "product": self.data.products[10].id,
+            "order": Order.objects.filter(user=self.user).latest("id").id,
+        }
+        for path, max_queries, max_ms in self.READS:
+            path = path.format(**ids)
+            with self.subTest(path=path):
+                response, query_count, elapsed = self.measure(lambda: self.api.get(path))
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinBudget(path, query_count, elapsed, max_queries, max_ms)
+
+    def test_checkout_and_cancel(self):
+        products = [product for product in self.data.products if product.stock is None][:5]
+        body = {
+            "items": [{"product_id": product.id, "quantity": 1} for product in products],
+            "delivery_address": {"street": "Bobur 1", "district": "Mirobod", "city": "Toshkent"},
+        }
+        response, query_count, elapsed = self.measure(lambda: self.api.post("/api/orders/", body, format="json"), runs=1)
+        self.assertEqual(response.status_code, 201)
+        # 9 as in OrderCreateTest, plus savepoint/insert/release of the new address
+        self.assertWithinBudget("checkout", query_count, elapsed, 12, 150)
+
+        path = f"/api/orders/{response.json()['id']}/cancel/"
+        response, query_count, elapsed = self.measure(lambda: self.api.post(path), runs=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget("cancel", query_count, elapsed, 7, 100)
+
+    def test_profile_update(self):
+        response, query_count, elapsed = self.measure(
+            lambda: self.api.put("/api/profile/", {"first_name": "Seed"}, format="json"), runs=1,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget("profile update", query_count, elapsed, 5, 100)
+
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_auth_endpoints(self):
+        User.objects.filter(pk=self.user.pk).update(password=MD5PasswordHasher().encode(seed.PASSWORD, "salt"))
+        client = APIClient()
+        body = {"username": self.user.raqam, "password": seed.PASSWORD}
+        response, query_count, elapsed = self.measure(lambda: client.post("/api/login/", body, format="json"), runs=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget("login", query_count, elapsed, 2, 50)
+
+        response, query_count, elapsed = self.measure(lambda: client.post("/api/token/refresh/"), runs=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget("refresh", query_count, elapsed, 5, 50)
+
+
+class SerializerBudgetTest(PerformanceBudgetMixin, TestCase):
+    """
+    Serializers must not query: everything they render is loaded by the
+    view's queryset, so ``.data`` runs with zero queries whatever the page size.
+    """
+    factory = APIRequestFactory()
+
+    def view(self, viewset, action, path, **kwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, self.user)
+        view = viewset(action=action, action_map={"get": action}, args=(), kwargs=kwargs, format_kwarg=None)
+        view.request = view.initialize_request(request)
+        return view
+
+    def assertSerializes(self, label, serializer, max_ms):
+        data, query_count, elapsed = self.measure(lambda: serializer.data, runs=1)
+        self.assertTrue(data)
+        self.assertWithinBudget(label, query_count, elapsed, 0, max_ms)
+
+    def test_product_list(self):
+        view = self.view(ProductViewSet, "list", "/api/products/")
+        products = list(view.get_queryset()[:100])
+        self.assertSerializes("products", view.get_serializer(products, many=True), 100)
+
+    def test_order_list_and_detail(self):
+        view = self.view(OrderViewSet, "list", "/api/orders/")
+        orders = list(view.get_queryset()[:50])
+        self.assertSerializes("orders", view.get_serializer(orders, many=True), 200)
+
+        view = self.view(OrderViewSet, "list", "/api/orders/?view=summary")
+        orders = list(view.get_queryset()[:100])
+        self.assertSerializes("order summaries", view.get_serializer(orders, many=True), 20)
+
+        order = orders[0]
+        view = self.view(OrderViewSet, "retrieve", f"/api/orders/{order.id}/", pk=order.id)
+        self.assertSerializes("order detail", view.get_serializer(view.get_queryset().get(pk=order.id)), 20)
+
+    def test_profile(self):
+        user = load_profile(User.objects.get(pk=self.user.pk))
+        self.assertSerializes("profile", UserSerializer(user), 20)
+
+
+class CatalogImportTest(TestCase):
+    CSV = (
+        "sku,name,description,cost,discount,weight,weight_unit,stock,category,subcategory,image\n"
+        "SUT-1,Sut 1L,Pasterizatsiyalangan,11000,,1,kg,40,Sut mahsulotlari,Sut,sut.jpg\n"
+        "QAT-1,Qatiq 0.5L,,7000,5,0.5,kg,,Sut mahsulotlari,Qatiq,\n"
+        "NON-1,Non,,abc,,,,,Non,Buxanka,\n"
+        "SUT-2,Sut 2L,,20000,,2,kg,10,Sut mahsulotlari,Sut,sut.jpg\n"
+    )
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.images = tempfile.TemporaryDirectory()
+        self.addCleanup(self.images.cleanup)
+        with open(os.path.join(self.images.name, "sut.jpg"), "wb") as f:
+            f.write(make_jpeg(64, 48).read())
+
+    def import_text(self, text, suffix=".csv", batch_size=2, images=True):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False, encoding="utf-8") as f:
+            f.write(text)
+        self.addCleanup(os.unlink, f.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_catalog", f.name, images=self.images.name if images else None, batch_size=batch_size,
+                     stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_creates_and_upserts(self):
+        out, err = self.import_text(self.CSV)
+        self.assertIn("3 created, 0 updated, 0 unchanged, 0 duplicate SKUs, 1 failed", out)
+        self.assertIn("line 4: cost is not a number", err)
+        self.assertIn("rows/s", out)
+        milk = Product.objects.get(sku="SUT-1")
+        self.assertEqual((milk.subcategory.name, milk.category.name, milk.stock), ("Sut", "Sut mahsulotlari", 40))
+        self.assertEqual(milk.image.name, "product_images/sut.jpg")
+        self.assertTrue(default_storage.exists("product_images/sut.jpg"))
+        self.assertEqual(SubCategory.objects.filter(category__name="Sut mahsulotlari").count(), 2)
+        self.assertEqual(self.client.get("/api/products/?search=qatiq").json()["count"], 1)
+
+        changed = self.CSV.replace("11000", "11500")
+        out, _ = self.import_text(changed)
+        self.assertIn("0 created, 1 updated, 2 unchanged", out)
+        milk.refresh_from_db()
+        self.assertEqual(str(milk.cost), "11500.00")
+
+    def test_out_of_range_numbers_are_row_errors(self):
+        header, good = self.CSV.splitlines()[:2]
+        bad = [
+            "B-1,Bad,,NaN,,,,,Non,Buxanka,", "B-2,Bad,,Infinity,,,,,Non,Buxanka,",
+            "B-3,Bad,,123456789.00,,,,,Non,Buxanka,", "B-4,Bad,,100.123,,,,,Non,Buxanka,",
+            "B-5,Bad,,100,1000,,,,Non,Buxanka,",
+        ]
+        out, err = self.import_text("\n".join([header, good, *bad]) + "\n", batch_size=10)
+        self.assertIn("1 created, 0 updated, 0 unchanged, 0 duplicate SKUs, 5 failed", out)
+        for line, field in zip(range(3, 8), ("cost", "cost", "cost", "cost", "discount")):
+            self.assertIn(f"line {line}: {field}", err)
+
+    def test_non_object_lines_are_row_errors(self):
+        rows = '[1, 2]\n42\n"SUT-9"\n{"sku": "SUT-9", "name": "Sut", "cost": "9000", "category": "Sut", "subcategory": "Sut"}\n'
+        out, err = self.import_text(rows, suffix=".ndjson", batch_size=10)
+        self.assertIn("1 created, 0 updated, 0 unchanged, 0 duplicate SKUs, 3 failed", out)
+        self.assertIn("line 1: expected a JSON object, not list", err)
+        self.assertIn("line 2: expected a JSON object, not int", err)
+
+    @override_settings(RESPONSE_CACHE_CLOCK_SKEW=0)
+    def test_moved_product_leaves_old_category_list(self):
+        cache.clear()
+        self.import_text(self.CSV)
+        old = Product.objects.get(sku="SUT-1").category_id
+        url = f"/api/products/?category_id={old}&page_size=1"  # SUT-1 is not on the cached page
+        time.sleep(0.01)  # keep tag and entry timestamps apart
+        self.assertEqual(self.client.get(url).json()["count"], 3)
+        self.assertEqual(self.client.get(url).json()["count"], 3)  # cached
+        self.import_text(self.CSV.replace("Sut mahsulotlari,Sut,sut.jpg\nQAT", "Ichimliklar,Sut,sut.jpg\nQAT"))
+        self.assertEqual(Product.objects.get(sku="SUT-1").category.name, "Ichimliklar")
+        self.assertEqual(self.client.get(url).json()["count"], 2)
+
+    def test_batches_use_constant_queries(self):
+        rows = "".join(f'{{"sku": "P-{i}", "name": "Mahsulot {i}", "cost": "{1000 + i}", "category": "Bo\'lim", '
+                       f'"subcategory": "Tur {i % 3}"}}\n' for i in range(30))
+        with CaptureQueriesContext(connection) as small:
+            self.import_text(rows[:rows.index("P-10")].rsplit("\n", 1)[0] + "\n", suffix=".ndjson", batch_size=10)
+        Product.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.import_text(rows, suffix=".ndjson", batch_size=10)
+        self.assertEqual(Product.objects.count(), 30)
+        per_batch = (len(large) - len(small)) / 2
+        self.assertLessEqual(per_batch, 10)
+
+    def test_export_round_trip(self):
+        self.import_text(self.CSV)
+        out = StringIO()
+        call_command("export_catalog", format="ndjson", stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["sku"] for row in rows], ["SUT-1", "QAT-1", "SUT-2"])
+        self.assertEqual(rows[0]["image"], "product_images/sut.jpg")
+        Product.objects.all().delete()
+        out, _ = self.import_text(out.getvalue(), suffix=".ndjson", images=False)
+        self.assertIn("3 created", out)
+        self.assertEqual(Product.objects.get(sku="SUT-2").image.name, "product_images/sut.jpg")
+
+
+class OrderExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed.seed(products=30, users=3, orders_per_user=8, items_per_order=3)
+        cls.staff = User.objects.create_user(username="hisobchi", password="secret", is_staff=True)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def export(self, **params):
+        response = self.api.get("/api/exports/orders/", params)
+        self.assertEqual(response.status_code, 200, getattr(response, "data", None))
+        return b"".join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        self.api.force_authenticate(self.data.users[0])
+        self.assertEqual(self.api.get("/api/exports/orders/?start=2000-01-01").status_code, 403)
+
+    def test_ndjson_nests_items_address_and_payments(self):
+        rows = [json.loads(line) for line in self.export(start="2000-01-01", **{"as": "ndjson"}).splitlines()]
+        self.assertEqual(len(rows), Order.objects.count())
+        self.assertEqual([row["order_date"] for row in rows], sorted(row["order_date"] for row in rows))
+        order = Order.objects.get(pk=rows[0]["order_id"])
+        self.assertEqual(rows[0]["total"], str(order.total))
+        self.assertEqual(len(rows[0]["items"]), order.items.count())
+        self.assertEqual(rows[0]["address"]["city"], "Toshkent")
+        self.assertEqual(len(rows[0]["payments"]), Payment.objects.filter(order=order).count())
+
+    def test_csv_has_one_line_per_item_within_the_range(self):
+        start, end = sorted(order.order_date for order in self.data.orders)[5:15:9]
+        text = self.export(start=start.isoformat(), end=end.isoformat())
+        rows = list(csv.DictReader(StringIO(text)))
+        orders = Order.objects.filter(order_date__gte=start, order_date__lt=end)
+        self.assertEqual(len({row["order_id"] for row in rows}), orders.count())
+        self.assertEqual(len(rows), OrderItem.objects.filter(order__in=orders).count())
+
+    def test_bad_arguments(self):
+        self.assertEqual(self.api.get("/api/exports/orders/").status_code, 400)
+        self.assertEqual(self.api.get("/api/exports/orders/?start=2000-01-01&as=xml").status_code, 400)
+
+    def test_batches_use_constant_queries_and_indexes(self):
+        start, end = order_export.parse_bound("2000-01-01"), timezone.now()
+        _, queries = query_plans.capture(list, order_export.export_orders(start, end, batch_size=5))
+        # orders, items, payments per batch of 5, plus the empty batch at the end
+        self.assertEqual(len(queries), 3 * 5 + 1)
+        for sql in queries:
+            self.assertEqual(query_plans.problems(sql), [], sql)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.ndjson")
+            err = StringIO()
+            call_command("export_orders", path, start="2000-01-01", stdout=StringIO(), stderr=err)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(sum(1 for _ in f), Order.objects.count())
+        self.assertIn(f"Exported {Order.objects.count()} orders", err.getvalue())
+
+
+class SalesRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="xaridor", password="secret")
+        self.staff = User.objects.create_user(username="tahlilchi", password="secret", is_staff=True)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        drinks = Category.objects.create(name="Ichimliklar", image="category_images/c.jpg")
+        dairy = Category.objects.create(name="Sut mahsulotlari", image="category_images/c.jpg")
+        juices = SubCategory.objects.create(category=drinks, name="Sharbatlar")
+        milk = SubCategory.objects.create(category=dairy, name="Sut")
+        self.juice = Product.objects.create(subcategory=juices, name="Olma sharbati", description="",
+                                            cost="10000.00", discount="10.00", image="product_images/p.jpg")
+        self.milk = Product.objects.create(subcategory=milk, name="Sut 1L", description="", cost="8000.00",
+                                           image="product_images/p.jpg")
+        self.drinks, self.dairy = drinks, dairy
+
+    def place(self, *lines):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post("/api/orders/", {
+                "items": [{"product_id": product.id, "quantity": quantity} for product, quantity in lines],
+                "delivery_address": {"street": "Navoiy 1", "district": "Shayxontohur", "city": "Toshkent"},
+            }, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["id"]
+
+    def rollups(self):
+        return {
+            "total": list(DailySales.objects.values_list("orders", "quantity", "revenue")),
+            "category": sorted(CategoryDailySales.objects.values_list("category_id", "orders", "quantity", "revenue")),
+            "product": sorted(ProductDailySales.objects.values_list("product_id", "orders", "quantity", "revenue")),
+        }
+
+    def test_orders_are_added_and_cancellations_subtracted(self):
+        self.place((self.juice, 2), (self.milk, 1))
+        order_id = self.place((self.juice, 1))
+        self.assertEqual(self.rollups()["total"], [(2, 4, Decimal("35000.00"))])
+        self.assertEqual(self.rollups()["category"], [
+            (self.drinks.id, 2, 3, Decimal("27000.00")), (self.dairy.id, 1, 1, Decimal("8000.00")),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.api.post(f"/api/orders/{order_id}/cancel/").status_code, 200)
+        analytics.sync(order_id)  # repeated syncs change nothing
+        self.assertEqual(self.rollups()["total"], [(1, 3, Decimal("26000.00"))])
+        self.assertEqual(self.rollups()["product"], [
+            (self.juice.id, 1, 2, Decimal("18000.00")), (self.milk.id, 1, 1, Decimal("8000.00")),
+        ])
+
+        Order.objects.get(pk=order_id - 1).delete()
+        self.assertEqual(self.rollups()["total"], [(0, 0, Decimal("0.00"))])
+
+    def test_failed_sync_does_not_fail_the_checkout(self):
+        with mock.patch.object(analytics, "_add", side_effect=OperationalError("deadlock")), \
+                self.assertLogs(level="ERROR"):
+            order_id = self.place((self.milk, 1))
+        self.assertFalse(Order.objects.get(pk=order_id).sales_recorded)
+        self.assertFalse(DailySales.objects.exists())
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.place((self.juice, 2), (self.milk, 1))
+        self.place((self.milk, 3))
+        cancelled = self.place((self.juice, 5))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post(f"/api/orders/{cancelled}/cancel/")
+        incremental = self.rollups()
+        for model in (DailySales, CategoryDailySales, SubCategoryDailySales, ProductDailySales):
+            model.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_sales_rollups", stdout=out)
+        self.assertIn("Rebuilt 1 days", out.getvalue())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_reports_read_only_the_rollups(self):
+        self.place((self.juice, 2), (self.milk, 1))
+        self.place((self.milk, 4))
+        self.api.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            sales = self.api.get("/api/analytics/sales/", {"level": "category", "id": self.dairy.id}).json()
+            top = self.api.get("/api/analytics/top/", {"ordering": "quantity", "limit": 1}).json()
+        for query in queries.captured_queries:
+            self.assertNotRegex(query["sql"], r'"backendapi_order(item)?"')
+        self.assertEqual(sales["results"][0]["name"], "Sut mahsulotlari")
+        self.assertEqual((sales["results"][0]["orders"], sales["results"][0]["revenue"]), (2, "40000.00"))
+        self.assertEqual([(row["name"], row["quantity"]) for row in top["results"]], [("Sut 1L", 5)])
+
+    def test_reports_are_staff_only_and_validated(self):
+        self.assertEqual(self.api.get("/api/analytics/sales/").status_code, 403)
+        self.api.force_authenticate(self.staff)
+        self.assertEqual(self.api.get("/api/analytics/sales/", {"level": "brand"}).status_code, 400)
+        self.assertEqual(self.api.get("/api/analytics/sales/", {"start": "2025-02-30"}).status_code, 400)
+        self.assertEqual(self.api.get("/api/analytics/top/", {"limit": 0}).status_code, 400)
+
+
+@skipIf(not settings.ADMIN_ENABLED, "the admin is not installed (DJANGO_ADMIN)")
+class AdminChangelistTest(TestCase):
+    PAGES = [
+        "/admin/backendapi/product/",
+        "/admin/backendapi/product/?category__id__exact={category}",
+        "/admin/backendapi/product/?q=olma",
+        "/admin/backendapi/order/",
+        "/admin/backendapi/order/?status=Delivered",
+        "/admin/backendapi/order/?q={order}",
+        "/admin/backendapi/order/{order}/change/",
+        "/admin/backendapi/orderitem/",
+        "/admin/backendapi/payment/",
+        "/admin/backendapi/address/",
+        "/admin/backendapi/customuser/",
+        "/admin/backendapi/customuser/?q=seed1",
+        "/admin/backendapi/subcategory/",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed.seed(products=120, users=6, orders_per_user=20, items_per_order=4)
+        cls.admin = User.objects.create_superuser(username="boshliq", password="secret", email="b@example.com")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pages_use_a_constant_number_of_queries(self):
+        ids = {"category": self.data.categories[0].id, "order": self.data.orders[0].id}
+        for page in self.PAGES:
+            page = page.format(**ids)
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(page)
+                self.assertEqual(response.status_code, 200)
+                # session, user, count, rows and at most a few filter/lookup queries; never one per row
+                self.assertLessEqual(len(queries), 10, "\n".join(q["sql"] for q in queries.captured_queries))
+
+    def test_unfiltered_count_uses_the_estimate(self):
+        with mock.patch("backendapi.admin.estimated_count", return_value=2_500_000):
+            response = self.client.get("/admin/backendapi/order/")
+            self.assertContains(response, "2500000 orders")
+            response = self.client.get("/admin/backendapi/order/?status=Delivered")
+        delivered = Order.objects.filter(status="Delivered").count()
+        self.assertContains(response, f"{delivered} order")
+
+
+@override_settings(RESPONSE_CACHE_CLOCK_SKEW=0)
+class AsyncCatalogTest(TestCase):
+    """The async catalog views answer exactly like the sync ones."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Sut", image="category_images/c.jpg")
+        self.subcategory = SubCategory.objects.create(category=category, name="Qatiq")
+        self.products = [
+            Product.objects.create(
+                subcategory=self.subcategory, name=f"Qatiq {i}", description="",
+                cost="9000.00", image="product_images/p.jpg",
+            )
+            for i in range(5)
+        ]
+        self.factory = AsyncRequestFactory()
+        self.product_list = ProductViewSet.as_async_view({"get": "list", "post": "create"})
+        self.product_detail = ProductViewSet.as_async_view({"get": "retrieve"})
+        self.category_list = CategoryViewSet.as_async_view({"get": "list"})
+        self.tree = CategoryViewSet.as_async_view({"get": "tree"})
+
+    def call(self, view, path, headers=None, **kwargs):
+        response = async_to_sync(view)(self.factory.get(path, headers=headers), **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    def test_list_matches_sync_view(self):
+        for path in ("/api/products/", "/api/products/?page_size=2&page=2", "/api/products/?fields=id,name"):
+            with self.subTest(path=path):
+                cache.clear()
+                expected = self.client.get(path)
+                cache.clear()
+                response = self.call(self.product_list, path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), expected.json())
+                self.assertEqual(response["ETag"], expected["ETag"])
+        self.assertEqual(
+            json.loads(self.call(self.category_list, "/api/categories/").content),
+            self.client.get("/api/categories/").json(),
+        )
+
+    def test_cursor_pagination(self):
+        seen = []
+        path = "/api/products/?pagination=cursor&page_size=2"
+        while path:
+            body = json.loads(self.call(self.product_list, path).content)
+            self.assertNotIn("count", body)
+            seen.extend(product["id"] for product in body["results"])
+            path = body["next"]
+        self.assertEqual(seen, [product.id for product in reversed(self.products)])
+
+    def test_detail_conditional_and_cached(self):
+        path = f"/api/products/{self.products[0].id}/"
+        first = self.call(self.product_detail, path, pk=self.products[0].id)
+        self.assertEqual((first.status_code, first["X-Cache"]), (200, "MISS"))
+        self.assertEqual(json.loads(first.content)["name"], "Qatiq 0")
+        time.sleep(0.01)  # keep tag and entry timestamps apart
+        with self.assertNumQueries(0):
+            second = self.call(self.product_detail, path, pk=self.products[0].id)
+            not_modified = self.call(self.product_detail, path, pk=self.products[0].id,
+                                     headers={"If-None-Match": first["ETag"]})
+        self.assertEqual((second["X-Cache"], second.content), ("HIT", first.content))
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_missing_detail_is_404(self):
+        self.assertEqual(self.call(self.product_detail, "/api/products/0/", pk=0).status_code, 404)
+
+    def test_category_tree(self):
+        response = self.call(self.tree, "/api/categories/tree/")
+        self.assertEqual(response.content, self.client.get("/api/categories/tree/").content)
+        response = self.call(self.tree, "/api/categories/tree/", headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_go_to_the_sync_view(self):
+        request = self.factory.post("/api/products/", {}, content_type="application/json")
+        response = async_to_sync(self.product_list)(request)
+        self.assertEqual(response.status_code, 401)
+
+
+class ProductionProfileTest(TestCase):
+    """DJANGO_ENV=production settings and the gunicorn config, loaded in a fresh interpreter."""
+
+    def load(self, code, **env):
+        unset = (
+            "DJANGO_DEBUG", "DJANGO_ADMIN", "DB_CONN_MAX_AGE", "ASYNC_CATALOG_READS",
+            "WEB_CONCURRENCY", "GUNICORN_THREADS", "GUNICORN_WORKER_CLASS", "CACHE_BACKEND", "CACHE_LOCATION",
+        )
+        env = dict(
+            {name: value for name, value in os.environ.items() if name not in unset},
+            DJANGO_SETTINGS_MODULE="storebackend.settings", **env,
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout)
+
+    def settings(self, **env):
+        return self.load(
+            "import json; from django.conf import settings as s; print(json.dumps({name: getattr(s, name) for name in "
+            "('DEBUG', 'INSTALLED_APPS', 'MIDDLEWARE', 'REST_FRAMEWORK', 'DATABASES', 'CACHES')}))",
+            **env,
+        )
+
+    def test_production_profile_is_lean(self):
+        production = self.settings(DJANGO_ENV="production")
+        self.assertFalse(production["DEBUG"])
+        for app in ("django_extensions", "sslserver", "django.contrib.admin", "django.contrib.sessions"):
+            self.assertNotIn(app, production["INSTALLED_APPS"])
+        self.assertEqual(production["MIDDLEWARE"], [
+            "corsheaders.middleware.CorsMiddleware",
+            "django.middleware.common.CommonMiddleware",
+            "django.middleware.security.SecurityMiddleware",
+        ])
+        self.assertEqual(
+            production["REST_FRAMEWORK"]["DEFAULT_RENDERER_CLASSES"], ["rest_framework.renderers.JSONRenderer"],
+        )
+        self.assertEqual(production["DATABASES"]["default"]["CONN_MAX_AGE"], 60)
+        self.assertEqual(production["CACHES"]["default"]["BACKEND"], "django.core.cache.backends.redis.RedisCache")
+
+    def test_admin_pool_and_development_defaults(self):
+        admin_pool = self.settings(DJANGO_ENV="production", DJANGO_ADMIN="1")
+        self.assertFalse(admin_pool["DEBUG"])
+        self.assertIn("django.contrib.admin", admin_pool["INSTALLED_APPS"])
+        self.assertIn("django.contrib.sessions.middleware.SessionMiddleware", admin_pool["MIDDLEWARE"])
+        development = self.settings(DJANGO_ENV="")
+        self.assertTrue(development["DEBUG"])
+        self.assertIn("django_extensions", development["INSTALLED_APPS"])
+        self.assertNotIn("DEFAULT_RENDERER_CLASSES", development["REST_FRAMEWORK"])
+        self.assertEqual(development["CACHES"]["default"]["BACKEND"], "django.core.cache.backends.locmem.LocMemCache")
+
+    def test_gunicorn_config(self):
+        code = (
+            "import json, os; from storebackend import gunicorn_conf as c; print(json.dumps({"
+            "'cpus': c.CPUS, 'workers': c.workers, 'threads': c.threads, 'worker_class': c.worker_class, "
+            "'preload_app': c.preload_app, 'env': os.environ['DJANGO_ENV']}))"
+        )
+        config = self.load(code, DJANGO_ENV="")
+        self.assertEqual(config["env"], "")  # an explicit DJANGO_ENV wins
+        self.assertEqual(config["workers"], 2 * config["cpus"] + 1)
+        self.assertEqual((config["threads"], config["worker_class"], config["preload_app"]), (2, "gthread", True))
+        config = self.load(code, WEB_CONCURRENCY="5", GUNICORN_THREADS="1")
+        self.assertEqual((config["workers"], config["worker_class"]), (5, "sync"))
+
+    def test_gunicorn_refuses_workers_on_locmem(self):
+        code = (
+            "import json; from types import SimpleNamespace; from storebackend import gunicorn_conf as c\n"
+            "def start(workers):\n"
+            "    try:\n"
+            "        c.on_starting(SimpleNamespace(cfg=SimpleNamespace(workers=workers)))\n"
+            "    except RuntimeError:\n"
+            "        return False\n"
+            "    return True\n"
+            "print(json.dumps([start(1), start(3)]))"
+        )
+        self.assertEqual(self.load(code, CACHE_BACKEND="locmem"), [True, False])
+        self.assertEqual(self.load(code), [True, True])  # redis, the production default
@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
@@ -24,7 +25,15 @@ from .views import (
     OrderViewSet,
     RegisterView,
     TokenRefreshView,
+    LogoutView,
+    LogoutAllView,
     UserProfileView,
+    ProfileAddressListView,
+    ProfilePaymentListView,
+    ProfileOrderListView,
+    OrderExportView,
+    SalesReportView,
+    TopSellersView,
 )
 
 router = DefaultRouter()
@@ -32,14 +41,41 @@ router.register(r'products', ProductViewSet, basename='product')
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'orders', OrderViewSet, basename='order')
 
-urlpatterns = [
+urlpatterns = []
+if settings.ASYNC_CATALOG_READS:
+    # same paths and names as the router's, matched first (see backendapi/async_views.py)
+    urlpatterns += [
+        path('products/', ProductViewSet.as_async_view({'get': 'list', 'post': 'create'}), name='product-list'),
+        path('products/<int:pk>/', ProductViewSet.as_async_view({
+            'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+        }), name='product-detail'),
+        path('categories/', CategoryViewSet.as_async_view({'get': 'list', 'post': 'create'}), name='category-list'),
+        path('categories/tree/', CategoryViewSet.as_async_view({'get': 'tree'}), name='category-tree'),
+        path('categories/<int:pk>/', CategoryViewSet.as_async_view({
+            'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+        }), name='category-detail'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 
     # Auth endpoints
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', MyTokenObtainPairView.as_view(), name='login'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('logout/', LogoutView.as_view(), name='logout'),
+    path('logout/all/', LogoutAllView.as_view(), name='logout_all'),
 
     # User endpoint
     path('profile/', UserProfileView.as_view(), name='user_profile'),
+    path('profile/addresses/', ProfileAddressListView.as_view(), name='profile_addresses'),
+    path('profile/payments/', ProfilePaymentListView.as_view(), name='profile_payments'),
+    path('profile/orders/', ProfileOrderListView.as_view(), name='profile_orders'),
+
+    # Operations exports
+    path('exports/orders/', OrderExportView.as_view(), name='export_orders'),
+
+    # Analytics, served from the sales rollups
+    path('analytics/sales/', SalesReportView.as_view(), name='analytics_sales'),
+    path('analytics/top/', TopSellersView.as_view(), name='analytics_top'),
 ]
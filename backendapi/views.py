@@ -1,39 +1,122 @@
+import logging
+
 from rest_framework import viewsets, permissions, filters, generics, status, serializers
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
 from rest_framework.exceptions import PermissionDenied
 from rest_framework_simplejwt.views import TokenObtainPairView
-
-
-from .models import Product, Category, Order, CustomUser
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+
+from . import analytics, authentication, category_tree, idempotency, inventory, order_export, revocation
+from .async_views import AsyncReadMixin
+from .conditional import ConditionalGetMixin
+from .models import Product, Category, Order, OrderItem, CustomUser, Address, Payment
+from .pagination import FeedPagination, PageNumberPagination
+from .response_cache import CachedResponseMixin
+from .search import ProductSearchFilter
 from .serializers import (
     ProductSerializer,
     CategorySerializer,
     OrderSerializer,
+    OrderListSerializer,
+    OrderSummarySerializer,
     RegisterSerializer,
     UserSerializer,
+    AddressSerializer,
+    PaymentSerializer,
     MyTokenObtainPairSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+PROFILE_RECENT_ITEMS = 5
+REFRESH_COOKIE = "refresh_token"
+
+
+def _count(queryset):
+    return Subquery(
+        queryset.order_by().values("user").annotate(count=Count("pk")).values("count"),
+        output_field=IntegerField(),
+    )
+
+
+def load_profile(user):
+    """
+    Attach counts and the most recent addresses/payments/orders to ``user``
+    with four queries, however long the user's history is.
+    """
+    counts = CustomUser.objects.filter(pk=user.pk).values(
+        address_count=Coalesce(_count(Address.objects.filter(user=OuterRef("pk"))), 0),
+        payment_count=Coalesce(_count(Payment.objects.filter(user=OuterRef("pk"))), 0),
+        order_count=Coalesce(_count(Order.objects.filter(user=OuterRef("pk"))), 0),
+    ).get()
+    for name, value in counts.items():
+        setattr(user, name, value)
+    user.recent_addresses = list(Address.objects.filter(user=user).order_by("-id")[:PROFILE_RECENT_ITEMS])
+    user.recent_payments = list(Payment.objects.filter(user=user).order_by("-payment_date", "-id")[:PROFILE_RECENT_ITEMS])
+    user.recent_order_ids = list(
+        Order.objects.filter(user=user).order_by("-order_date", "-id").values_list("id", flat=True)[:PROFILE_RECENT_ITEMS]
+    )
+    return user
+
+
 class UserProfileView(APIView):
-    """Return the logged-in user's profile data (addresses, orders, payments, etc.)."""
+    """Return the logged-in user's profile: core fields, counts and the most recent items."""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(load_profile(request.user))
         return Response(serializer.data)
 
     def put(self, request):
         serializer = UserSerializer(request.user, data=request.data, partial=True)
-        print(f"Updating user profile with data: {request.data}")  # Debugging line
-        print(f"Is serializer valid? {serializer}")  # Debugging line
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            user = serializer.save()
+            return Response(UserSerializer(load_profile(user)).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ProfileAddressListView(generics.ListAPIView):
+    serializer_class = AddressSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        return Address.objects.filter(user=self.request.user).order_by("-id")
+
+
+class ProfilePaymentListView(generics.ListAPIView):
+    serializer_class = PaymentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        return Payment.objects.filter(user=self.request.user).order_by("-payment_date", "-id")
+
+
+class ProfileOrderListView(generics.ListAPIView):
+    serializer_class = OrderSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedPagination
+    keyset_ordering = ("-order_date", "-id")
+
+    def get_queryset(self):
+        return (
+            Order.objects.filter(user=self.request.user)
+            .only(*OrderSummarySerializer.Meta.fields)
+            .order_by(*self.keyset_ordering)
+        )
+
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """Custom permission to only allow owners of an object to edit it."""
 
@@ -43,6 +126,17 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return obj.created_by == request.user
 
 
+def set_refresh_cookie(response, refresh):
+    response.set_cookie(
+        key=REFRESH_COOKIE,
+        value=str(refresh),
+        httponly=True,
+        secure=True,        # ⚠️ Set True in production (requires HTTPS)
+        samesite="None",
+        max_age=60 * 60 * 24 * 7,  # 7 days
+    )
+
+
 class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = RegisterSerializer
@@ -54,7 +148,7 @@ class RegisterView(generics.CreateAPIView):
         user = serializer.save()
 
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = authentication.token_for(user)
         access_token = str(refresh.access_token)
 
         # Response payload
@@ -67,14 +161,7 @@ class RegisterView(generics.CreateAPIView):
         response = Response(response_data, status=status.HTTP_201_CREATED)
 
         # Store refresh token in secure HTTP-only cookie
-        response.set_cookie(
-            key="refresh_token",
-            value=str(refresh),
-            httponly=True,
-            secure=True,        # ⚠️ Set True in production (requires HTTPS)
-            samesite="None",
-            max_age=60 * 60 * 24 * 7,  # 7 days
-        )
+        set_refresh_cookie(response, refresh)
 
         return response
 
@@ -85,18 +172,58 @@ class TokenRefreshView(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]  # must be AllowAny
 
     def post(self, request, *args, **kwargs):
-        refresh_token = request.COOKIES.get("refresh_token")
-        print(f"Refresh token from cookies: {refresh_token}")  # Debugging line
+        refresh_token = request.COOKIES.get(REFRESH_COOKIE)
         if not refresh_token:
             return Response({"detail": "Refresh token not provided."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             refresh = RefreshToken(refresh_token)
-            access_token = str(refresh.access_token)
-            return Response({"access": access_token}, status=status.HTTP_200_OK)
-        except Exception as e:
+            authentication.verify(refresh)
+            # Each refresh token works once; the response carries its successor.
+            refresh = revocation.rotate(refresh)
+        except (TokenError, AuthenticationFailed) as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        response = Response({"access": str(refresh.access_token)}, status=status.HTTP_200_OK)
+        set_refresh_cookie(response, refresh)
+        return response
+
+
+class LogoutView(APIView):
+    """Revoke the refresh token in the cookie and clear it."""
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        refresh_token = request.COOKIES.get(REFRESH_COOKIE)
+        if refresh_token:
+            try:
+                revocation.revoke(RefreshToken(refresh_token))
+            except TokenError:
+                pass  # expired or forged, nothing to revoke
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        response.delete_cookie(REFRESH_COOKIE, samesite="None")
+        return response
+
+
+class LogoutAllView(APIView):
+    """
+    Log out of all devices: bumping ``token_generation`` invalidates every
+    refresh and access token issued to the user so far, in one UPDATE.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        user_id = request.user.pk
+        CustomUser.objects.filter(pk=user_id).update(token_generation=F("token_generation") + 1)
+        authentication.forget(user_id)
+        transaction.on_commit(lambda: authentication.forget(user_id))
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        response.delete_cookie(REFRESH_COOKIE, samesite="None")
+        return response
+
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
@@ -104,66 +231,237 @@ class MyTokenObtainPairView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.user  # Assumes serializer sets user
-        refresh = RefreshToken.for_user(user)
+        user = serializer.user
+        refresh = serializer.refresh  # the one token pair minted during validation
         response_data = serializer.validated_data
         response_data['username'] = user.username
         response_data['raqam'] = user.raqam
         response = Response(response_data, status=status.HTTP_200_OK)
-        response.set_cookie(
-            key="refresh_token",
-            value=str(refresh),
-            httponly=True,
-            secure=True,  # Set to True in production with HTTPS
-            samesite="None",
-            max_age=60 * 60 * 24 * 7
-        )
+        set_refresh_cookie(response, refresh)
         return response
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     pagination_class = None  # disable pagination for categories
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by("-created_at")
+    @action(detail=False, methods=["get"], authentication_classes=[], permission_classes=[permissions.AllowAny])
+    def tree(self, request):
+        """Categories with their subcategories and product counts, served from cache."""
+        return self.tree_response(request, *category_tree.get())
+
+    async def atree(self, request):
+        return self.tree_response(request, *await category_tree.aget())
+
+    @staticmethod
+    def tree_response(request, etag, body):
+        response = get_conditional_response(request, etag=etag) or HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+class ProductViewSet(CachedResponseMixin, ConditionalGetMixin, AsyncReadMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.all().order_by("-created_at", "-id")
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["name", "description"]
+    pagination_class = FeedPagination
+    keyset_ordering = ("-created_at", "-id")
+    conditional_timestamps = ("updated_at", "subcategory__updated_at", "subcategory__category__updated_at")
+    filter_backends = [ProductSearchFilter, filters.OrderingFilter]
     ordering_fields = ["cost", "created_at"]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def response_cache_scope(self, request):
+        if self.action != "list":
+            return ()
+        category_id = request.query_params.get("category_id")
+        return [f"products:category:{category_id}"] if category_id else ["products"]
+
+    def response_cache_tags(self, product):
+        return [
+            f"product:{product.pk}",
+            f"subcategory:{product.subcategory_id}",
+            f"category:{product.subcategory.category_id}",
+        ]
+
     def get_queryset(self):
-        queryset = Product.objects.all().order_by("-created_at")
+        # subcategory -> category is always rendered (nested or as ids), so join it up front
+        queryset = Product.objects.select_related("subcategory__category").order_by(*self.keyset_ordering)
         category_id = self.request.query_params.get("category_id")
         if category_id:
-            queryset = queryset.filter(subcategory__category_id=category_id)  # ✅ fixed relation
+            queryset = queryset.filter(category_id=category_id)  # denormalized, see product_category_created_idx
         return queryset
 
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedPagination
+    keyset_ordering = ("-order_date", "-id")
+    # no update or delete: an order holds reserved stock until it is cancelled
+    # (the cancel action) or its reservation expires, see backendapi.inventory
+    http_method_names = ["get", "post", "head", "options"]
 
     def create(self, request, *args, **kwargs):
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            return self.create_order(request)
+
+        record = idempotency.claim(request.user, key, request.data)
+        if record.status_code is not None:
+            body = record.response_body
+            if body is None:  # completed before response bodies were stored: the order as it is now
+                body = self.get_serializer(self.get_queryset().get(pk=record.order_id)).data
+            response = Response(body, status=record.status_code)
+            response["Idempotent-Replayed"] = "true"
+            return response
+        try:
+            with transaction.atomic():
+                response = self.create_order(request)
+                if status.is_success(response.status_code):
+                    idempotency.complete(record, response.data["id"], response.status_code, response.data)
+        except Exception:
+            idempotency.release(record)
+            raise
+        if not status.is_success(response.status_code):
+            idempotency.release(record)
+        return response
+
+    def create_order(self, request):
+        # validate once; ModelViewSet.create would build and validate a second serializer
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
         except serializers.ValidationError as e:
-            print("Validation errors:", e.detail)  # now you will see them
+            logger.debug("Order validation failed: %s", e.detail)
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
-        return super().create(request, *args, **kwargs)
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def is_summary(self):
+        return self.action == "list" and self.request.query_params.get("view") == "summary"
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return OrderSummarySerializer
+        if self.action == "list":
+            return OrderListSerializer
+        return OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.filter(user=self.request.user).order_by(*self.keyset_ordering)
+        if self.is_summary():
+            return queryset.only(*OrderSummarySerializer.Meta.fields)
+        if self.action == "list":
+            items = OrderItem.objects.select_related("product")
+        else:
+            items = OrderItem.objects.select_related("product__subcategory__category")
+        return queryset.select_related("delivery_address").prefetch_related(Prefetch("items", queryset=items))
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        """Cancel a pending order and return its reserved stock."""
+        order = self.get_object()
+        if order.status != inventory.PENDING:
+            return Response({"detail": f"Only pending orders can be cancelled (status is {order.status})."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        inventory.release(order, status=inventory.CANCELLED)
+        # set in memory: refresh_from_db() would drop the prefetched items
+        order.status, order.stock_reserved = inventory.CANCELLED, False
+        return Response(self.get_serializer(order).data)
 
     def perform_create(self, serializer):
         try:
             serializer.save(user=self.request.user)
         except serializers.ValidationError as e:
-            print("Validation errors:", e.detail)  # now you will see them
+            logger.debug("Order rejected: %s", e.detail)  # e.g. out of stock
             raise
+
+
+class OrderExportView(APIView):
+    """
+    Staff-only streaming export of the orders placed in a date range:
+    ``?start=YYYY-MM-DD&end=YYYY-MM-DD&as=csv|ndjson`` (``end`` is inclusive
+    and defaults to now). See ``backendapi.order_export``.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get("as", "csv")
+        if fmt not in order_export.FORMATS:
+            raise serializers.ValidationError({"as": f"Must be one of {', '.join(order_export.FORMATS)}."})
+        end = request.query_params.get("end")
+        try:
+            start = order_export.parse_bound(request.query_params.get("start"))
+            end = order_export.parse_bound(end, end=True) if end else timezone.now()
+        except ValueError as e:
+            raise serializers.ValidationError({"detail": str(e)})
+        records = order_export.export_orders(start, end)
+        response = StreamingHttpResponse(
+            order_export.render(records, fmt), content_type=order_export.CONTENT_TYPES[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="orders-{start:%Y%m%d}-{end:%Y%m%d}.{fmt}"'
+        response["X-Accel-Buffering"] = "no"  # let nginx pass chunks through as they are produced
+        return response
+
+
+def _report_range(request):
+    try:
+        return analytics.parse_range(request.query_params.get("start"), request.query_params.get("end"))
+    except ValueError as e:
+        raise serializers.ValidationError({"detail": str(e)})
+
+
+def _choice(request, name, choices, default):
+    value = request.query_params.get(name, default)
+    if value not in choices:
+        raise serializers.ValidationError({name: f"Must be one of {', '.join(choices)}."})
+    return value
+
+
+class SalesReportView(APIView):
+    """
+    Staff-only daily sales read from the rollup tables:
+    ``?level=total|category|subcategory|product&start=&end=&id=..`` (the
+    last 30 days by default). See ``backendapi.analytics``.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        level = _choice(request, "level", tuple(analytics.LEVELS), "total")
+        start, end = _report_range(request)
+        ids = request.query_params.getlist("id")
+        if not all(value.isdigit() for value in ids):
+            raise serializers.ValidationError({"id": "Must be integers."})
+        return Response({
+            "level": level, "start": start, "end": end,
+            "results": analytics.series(level, start, end, [int(value) for value in ids]),
+        })
+
+
+class TopSellersView(APIView):
+    """
+    Staff-only best sellers of a date range from the rollup tables:
+    ``?level=product|subcategory|category&ordering=revenue|quantity|orders&limit=10``.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        level = _choice(request, "level", ("product", "subcategory", "category"), "product")
+        ordering = _choice(request, "ordering", analytics.ORDERINGS, "revenue")
+        limit = request.query_params.get("limit", "10")
+        if not limit.isdigit() or not 1 <= int(limit) <= self.max_limit:
+            raise serializers.ValidationError({"limit": f"Must be between 1 and {self.max_limit}."})
+        start, end = _report_range(request)
+        return Response({
+            "level": level, "start": start, "end": end, "ordering": ordering,
+            "results": analytics.top(level, start, end, ordering, int(limit)),
+        })
@@ -0,0 +1,73 @@
+"""
+gunicorn configuration for production::
+
+    gunicorn -c python:storebackend.gunicorn_conf storebackend.wsgi:application
+
+Turns on the production settings profile (``DJANGO_ENV``, see settings.py)
+and sizes the server from the CPUs this process may run on: ``2 * CPUs + 1``
+worker processes with ``GUNICORN_THREADS`` threads each, so a worker waiting
+on MySQL or the cache still serves requests. Every value can be overridden
+from the environment (``WEB_CONCURRENCY``, ``GUNICORN_THREADS``,
+``GUNICORN_WORKER_CLASS``, ...) or on the command line.
+
+The application is imported once in the master (``preload_app``) and forked,
+so workers start immediately and share its memory pages. Database
+connections opened while importing are closed before forking; each worker
+opens its own.
+
+Several workers need a shared cache (``CACHE_BACKEND=redis``, the production
+default): response cache invalidations, cached auth entries and the token
+revocation filter would go stale across per-process locmem caches, so the
+server refuses to start more than one worker on locmem.
+
+For the async catalog pool (``ASYNC_CATALOG_READS``) set
+``GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker`` and serve
+``storebackend.asgi:application``; threads do not apply there.
+"""
+import os
+
+os.environ.setdefault('DJANGO_ENV', 'production')
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+CPUS = _cpus()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', 2 * CPUS + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+preload_app = True
+
+# IDEMPOTENCY_LOCK_TIMEOUT assumes no request runs longer than this
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 90))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then so slow leaks cannot accumulate
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+# worker heartbeats on tmpfs rather than on the container's overlay filesystem
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def on_starting(server):
+    from django.conf import settings
+    from django.core.cache.backends.locmem import LocMemCache
+
+    backend = settings.CACHES['default']['BACKEND']
+    if server.cfg.workers > 1 and backend == f'{LocMemCache.__module__}.{LocMemCache.__name__}':
+        raise RuntimeError(
+            f"{server.cfg.workers} workers cannot share the per-process locmem cache; "
+            "set CACHE_BACKEND=redis (and CACHE_LOCATION) or WEB_CONCURRENCY=1."
+        )
+
+
+def when_ready(server):
+    from django.db import connections
+
+    connections.close_all()
@@ -24,8 +24,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-ww(uzc)g)@o&&1rqb9co1f*$bpp9(8s=&p^=!n#q_eo64m856%'
 
 
+# DJANGO_ENV=production selects the lean profile: no DEBUG, no development
+# apps, JSON-only API, and no session machinery unless DJANGO_ADMIN=1.
+# storebackend/gunicorn_conf.py sets it for the production server.
+PRODUCTION = os.getenv("DJANGO_ENV") == "production"
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# (DEBUG also keeps every executed query in memory)
+DEBUG = os.getenv("DJANGO_DEBUG", "0" if PRODUCTION else "1") == "1"
+
+# The admin (and the browsable API login) needs sessions, CSRF and messages;
+# a JWT-only API server does not. Serve the admin from a separate pool with
+# DJANGO_ADMIN=1 when the production profile is on.
+ADMIN_ENABLED = os.getenv("DJANGO_ADMIN", "0" if PRODUCTION else "1") == "1"
 
 ALLOWED_HOSTS = ["*"]
 
@@ -34,27 +45,29 @@ ALLOWED_HOSTS = ["*"]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'backendapi.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,  # default items per page
 }
+if PRODUCTION:
+    # the browsable API renders a template per response
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ('rest_framework.renderers.JSONRenderer',)
 
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
     'django.contrib.staticfiles',
 
-    "django_extensions",
-    "sslserver",
     'corsheaders',
     'backendapi',
     'rest_framework',
 ]
+if ADMIN_ENABLED:
+    INSTALLED_APPS[:0] = ['django.contrib.admin', 'django.contrib.sessions', 'django.contrib.messages']
+if not PRODUCTION:
+    INSTALLED_APPS += ["django_extensions", "sslserver"]
 
 AUTH_USER_MODEL = "backendapi.CustomUser"
 
@@ -62,12 +75,15 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if ADMIN_ENABLED:
+    MIDDLEWARE += [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ]
 
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -84,8 +100,7 @@ TEMPLATES = [
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
+            ] + (['django.contrib.messages.context_processors.messages'] if ADMIN_ENABLED else []),
         },
     },
 ]
@@ -108,6 +123,20 @@ DATABASES = {
         }
 }
 
+# DB_ENGINE=sqlite runs everything (tests included) offline against a local file
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("SQLITE_PATH", str(BASE_DIR / "db.sqlite3")),
+    }
+
+# Seconds a connection is reused across requests (0: one per request). Keep 0
+# on ASGI workers, where every request runs in a thread of its own.
+DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv(
+    "DB_CONN_MAX_AGE", "60" if PRODUCTION and os.getenv("ASYNC_CATALOG_READS") != "1" else "0",
+))
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -146,9 +175,64 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Idempotency-Key support for POST /api/orders/ (see backendapi/idempotency.py)
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 120  # take over claims older than this (gunicorn --timeout is 90)
+
+# Pending orders hold their stock this long (see backendapi/inventory.py)
+STOCK_RESERVATION_TTL = 60 * 30
+
+# Access tokens authenticate from a cached user entry kept this long
+# (see backendapi/authentication.py)
+AUTH_USER_CACHE_TTL = 60 * 5
+
+# Cache backend: "locmem" for a single process; "file" or "redis" when several
+# processes or nodes must share cached responses and their invalidations
+# (CACHE_LOCATION is the directory or the redis:// URL). The production
+# profile defaults to redis: locmem is private to each gunicorn worker, and
+# storebackend/gunicorn_conf.py refuses to start more than one worker on it.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis" if PRODUCTION else "locmem")
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "storebackend"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(BASE_DIR / "cache")),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+}
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_BACKENDS[CACHE_BACKEND][1]),
+        "OPTIONS": {"MAX_ENTRIES": 10000} if CACHE_BACKEND != "redis" else {},
+    },
+}
+
+# Anonymous product list/detail responses (see backendapi/response_cache.py)
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+RESPONSE_CACHE_LOCK_TIMEOUT = 10  # a recomputation taking longer loses its lock
+RESPONSE_CACHE_LOCK_WAIT = 5  # how long other requests wait for it
+RESPONSE_CACHE_CLOCK_SKEW = 1  # seconds of clock difference tolerated between nodes
+
+# Rebuild the in-process revoked refresh token filter this often
+# (see backendapi/revocation.py)
+TOKEN_REVOCATION_REBUILD_INTERVAL = 60 * 60
+
+# Serve catalog reads (products, categories, category tree) from async views;
+# for ASGI workers only (see backendapi/async_views.py)
+ASYNC_CATALOG_READS = os.getenv("ASYNC_CATALOG_READS") == "1"
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# How /media/ is delivered: "django" (streamed by the worker), "x-accel-redirect" (nginx)
+# or "x-sendfile" (Apache/lighttpd). See backendapi/media.py.
+MEDIA_DELIVERY = os.getenv("MEDIA_DELIVERY", "django")
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24
+
+# Resized WebP/JPEG copies of uploaded images (see backendapi/images.py)
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1024)
+IMAGE_VARIANTS_ASYNC = True  # generate on a background thread after commit
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 